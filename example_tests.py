@@ -1,17 +1,27 @@
 #!/usr/bin/env python3
 
 import numpy as np
-from twizzle import TestRunner
+from twizzle import TestRunner, FeatureCache
 from twizzle.utils import load_image
 from twizzle.deviation_presets import hamming_distance
 
 # global config
 NR_OF_THREADS = 10
 
+# hash sizes of the sweep
+HASH_SIZES = [8, 16, 32]
 
-def test_dhash(aOriginalImages, aComparativeImages, lThreshold=0.15, lHashSize=16):
-    from twizzle.hashalgos_preset import dhash
+# hashes are computed once per image for all hash sizes and reused for every threshold
+FEATURE_CACHE = FeatureCache(lMaxEntries=100000)
+
+
+def compute_dhashes(sPath):
+    from twizzle.hashalgos_preset import dhash, multi_size_hash
+    # one decode and one full resolution resize for all hash sizes
+    return multi_size_hash(load_image(sPath), dhash, HASH_SIZES)
 
+
+def test_dhash(aOriginalImages, aComparativeImages, lThreshold=0.15, lHashSize=16):
     # create dictionary of metadata
     dicMetadata = {"algorithm": "dhash",
                    "hash_size": lHashSize, "threshold": lThreshold}
@@ -21,13 +31,11 @@ def test_dhash(aOriginalImages, aComparativeImages, lThreshold=0.15, lHashSize=1
     for i, aOriginalImagePath in enumerate(aOriginalImages):
         aComparativeImagePath = aComparativeImages[i]
 
-        # get images from path
-        aOriginalImage = load_image(aOriginalImagePath)
-        aComparativeImage = load_image(aComparativeImagePath)
-
-        # calculate hashes
-        aHashOriginal = dhash(aOriginalImage, hash_size=lHashSize)
-        aHashComparative = dhash(aComparativeImage, hash_size=lHashSize)
+        # load images from path and calculate hashes if they are not cached yet
+        aHashOriginal = FEATURE_CACHE.get_or_compute(aOriginalImagePath, "dhash_multi_size",
+                                                     compute_dhashes, {"hash_sizes": HASH_SIZES})[lHashSize]
+        aHashComparative = FEATURE_CACHE.get_or_compute(aComparativeImagePath, "dhash_multi_size",
+                                                        compute_dhashes, {"hash_sizes": HASH_SIZES})[lHashSize]
 
         # calculate deviation
         dDeviation = hamming_distance(aHashComparative, aHashOriginal)
@@ -47,12 +55,14 @@ def test_dhash(aOriginalImages, aComparativeImages, lThreshold=0.15, lHashSize=1
 
 if __name__ == "__main__":
     sDBPath = "test.db"
-    oRunner = TestRunner(sDBPath, lNrOfThreads=NR_OF_THREADS)
+    # tests saved by an earlier (e.g. crashed) run are not run again
+    oRunner = TestRunner(sDBPath, lNrOfThreads=NR_OF_THREADS,
+                         bSkipExistingTests=True)
 
     # iterate over thresholds
     for lThreshold in np.arange(0.05, 0.5, 0.05):
         # iterate over hash sizes
-        for lHashSize in [8, 16, 32]:
+        for lHashSize in HASH_SIZES:
             # add test to testrunner
             oRunner.run_test_async("image_hashing_challenge_print_scan_1", test_dhash, {
                                    "lThreshold": lThreshold, "lHashSize": lHashSize})
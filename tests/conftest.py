@@ -0,0 +1,56 @@
+import functools
+import glob
+import os
+
+import pytest
+
+from twizzle import Twizzle
+from twizzle import hashalgos_preset
+from twizzle.deviation_presets import hamming_distance
+from twizzle.utils import load_image
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "_img")
+IMAGE_PATHS = sorted(glob.glob(os.path.join(IMAGE_DIR, "*.png")))
+CHALLENGE_NAME = "img_pairs"
+
+# thresholds of the normalized dhash distance giving different decisions on the image pairs
+THRESHOLDS = [0.1, 0.2, 0.4]
+
+
+@functools.lru_cache(maxsize=None)
+def get_dhash(sPath):
+    return hashalgos_preset.dhash(load_image(sPath))
+
+
+def dhash_decisions(aOriginalObjects, aComparativeObjects, dThreshold=0.1):
+    """callback of the tests: images are the same if their dhashes differ in at most dThreshold of the bits"""
+    aDecisions = [hamming_distance(get_dhash(sOriginal), get_dhash(sComparative)) <= dThreshold
+                  for sOriginal, sComparative in zip(aOriginalObjects, aComparativeObjects)]
+    return aDecisions, {"threshold": dThreshold, "algorithm": "dhash"}
+
+
+def dhash_scores(aOriginalObjects, aComparativeObjects):
+    """callback of threshold sweeps: normalized distance of the dhashes of every pair"""
+    aScores = [hamming_distance(get_dhash(sOriginal), get_dhash(sComparative))
+               for sOriginal, sComparative in zip(aOriginalObjects, aComparativeObjects)]
+    return aScores, {"algorithm": "dhash"}
+
+
+def get_pairs():
+    """all ordered pairs of the example images and whether they are the same image"""
+    aOriginals = [a for a in IMAGE_PATHS for _ in IMAGE_PATHS]
+    aComparatives = [b for _ in IMAGE_PATHS for b in IMAGE_PATHS]
+    return aOriginals, aComparatives, [a == b for a, b in zip(aOriginals, aComparatives)]
+
+
+@pytest.fixture(scope="session")
+def aImages():
+    return [load_image(sPath) for sPath in IMAGE_PATHS]
+
+
+@pytest.fixture
+def sDBPath(tmp_path):
+    """database holding a challenge of all pairs of the example images"""
+    sDBPath = str(tmp_path / "test.db")
+    Twizzle(sDBPath).add_challenge(CHALLENGE_NAME, *get_pairs())
+    return sDBPath
@@ -0,0 +1,121 @@
+import sqlite3
+from threading import Thread
+
+import pytest
+
+from twizzle import Twizzle
+from twizzle import storage
+from twizzle.compact_challenge import CompactChallenge, get_snapshot_path
+
+STORAGES = [storage.STORAGE_SQLITEDICT, storage.STORAGE_SQLITE]
+
+
+def add_challenge(tw, lSize, sPrefix="o"):
+    tw.add_challenge("c", ["%s_%d" % (sPrefix, i) for i in range(lSize)], ["c_%d" % i for i in range(lSize)],
+                     [i % 3 == 0 for i in range(lSize)])
+
+
+def count_rows(sDBPath, sTable):
+    with sqlite3.connect(sDBPath) as conn:
+        return conn.execute("SELECT COUNT(*) FROM %s" % sTable).fetchone()[0]
+
+
+@pytest.mark.parametrize("sStorage", STORAGES)
+def test_compact_challenge_round_trip(tmp_path, sStorage):
+    sDBPath = str(tmp_path / "test.db")
+    tw = Twizzle(sDBPath, sStorage)
+    aOriginals = ["a.png", "b\u00e4.png", "a.png", ""]
+    aComparatives = ["b\u00e4.png", "c/d.png", "a.png", "e.png"]
+    tw.add_challenge("c", aOriginals, aComparatives, [False, False, True, False], {"attack": "none"})
+    dicChallenge = tw.get_challenge("c")
+    oCompactChallenge = tw.get_compact_challenge("c")
+    assert len(oCompactChallenge) == 4
+    assert oCompactChallenge.to_challenge() == dicChallenge
+    assert CompactChallenge.from_challenge(dicChallenge).to_challenge() == dicChallenge
+    assert list(dicChallenge["originalObjects"]) == aOriginals
+    assert list(dicChallenge["comparativeObjects"]) == aComparatives
+    if sStorage == storage.STORAGE_SQLITE:
+        assert count_rows(sDBPath, "challenge_arrays") == 1
+        assert count_rows(sDBPath, "challenge_pairs") == 0
+
+
+@pytest.mark.parametrize("sStorage", STORAGES)
+def test_paths_containing_nul_are_kept(tmp_path, sStorage):
+    sDBPath = str(tmp_path / "test.db")
+    tw = Twizzle(sDBPath, sStorage)
+    aOriginals = ["a\0b.png", "a.png", "a"]
+    aComparatives = ["a.png", "a\0b.png", "b.png"]
+    tw.add_challenge("c", aOriginals, aComparatives, [True, False, True])
+    dicChallenge = Twizzle(sDBPath, sStorage).get_challenge("c")
+    assert list(dicChallenge["originalObjects"]) == aOriginals
+    assert list(dicChallenge["comparativeObjects"]) == aComparatives
+    assert list(dicChallenge["targetDecisions"]) == [True, False, True]
+    # the path table separates the paths by NUL, so these challenges have no compact form
+    with pytest.raises(Exception):
+        tw.get_compact_challenge("c")
+    if sStorage == storage.STORAGE_SQLITE:
+        assert count_rows(sDBPath, "challenge_arrays") == 0
+        assert count_rows(sDBPath, "challenge_pairs") == 3
+    tw.del_challenge("c")
+    with pytest.raises(Exception):
+        tw.get_challenge("c")
+
+
+@pytest.mark.parametrize("sStorage", STORAGES)
+def test_snapshot_of_replaced_challenge_is_not_served(tmp_path, sStorage):
+    sDBPath, sSnapshotDir = str(tmp_path / "test.db"), str(tmp_path / "snapshots")
+    tw = Twizzle(sDBPath, sStorage, sSnapshotDir)
+    add_challenge(tw, 10)
+    tw.export_challenge_snapshot("c")
+    assert list(tw.get_challenge("c")["originalObjects"]) == ["o_%d" % i for i in range(10)]
+
+    # replaced by an instance without the snapshot directory, the snapshot is outdated
+    twOther = Twizzle(sDBPath, sStorage)
+    twOther.del_challenge("c")
+    add_challenge(twOther, 5, "n")
+    assert tw.get_challenge("c") == twOther.get_challenge("c")
+
+    # replaced by the instance having the snapshot, the snapshot is removed
+    tw.export_challenge_snapshot("c")
+    tw.del_challenge("c")
+    with pytest.raises(Exception):
+        tw.get_challenge("c")
+    add_challenge(tw, 3)
+    assert tw.get_challenge("c") == twOther.get_challenge("c")
+
+
+@pytest.mark.parametrize("sStorage", STORAGES)
+def test_snapshot_of_deleted_challenge_is_not_served(tmp_path, sStorage):
+    sDBPath, sSnapshotDir = str(tmp_path / "test.db"), str(tmp_path / "snapshots")
+    tw = Twizzle(sDBPath, sStorage, sSnapshotDir)
+    add_challenge(tw, 10)
+    tw.export_challenge_snapshot("c")
+    Twizzle(sDBPath, sStorage).del_challenge("c")
+    with pytest.raises(Exception):
+        tw.get_challenge("c")
+
+
+def test_snapshot_can_be_replaced_while_it_is_loaded(tmp_path):
+    sDBPath, sSnapshotDir = str(tmp_path / "test.db"), str(tmp_path / "snapshots")
+    tw = Twizzle(sDBPath, storage.STORAGE_SQLITE, sSnapshotDir)
+    add_challenge(tw, 1000)
+    dicExpected = tw.get_challenge("c")
+    tw.export_challenge_snapshot("c")
+    aErrors = []
+
+    def export():
+        try:
+            for _ in range(300):
+                tw.export_challenge_snapshot("c")
+        except Exception as e:
+            aErrors.append(e)
+
+    oExporter = Thread(target=export)
+    oExporter.start()
+    while oExporter.is_alive():
+        assert tw.get_challenge("c") == dicExpected
+    oExporter.join()
+    assert not aErrors
+    # only the current snapshot is left
+    assert len(list((tmp_path / "snapshots").iterdir())) == 2
+    assert get_snapshot_path(sSnapshotDir, "c") in [str(p) for p in (tmp_path / "snapshots").iterdir()]
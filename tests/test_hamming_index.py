@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+from twizzle import HammingIndex
+from twizzle.deviation_presets import hamming_distance_matrix
+
+
+@pytest.fixture(scope="module")
+def aHashes():
+    # clusters of near duplicates, so searches find neighbours at small and large distances
+    oRandom = np.random.default_rng(0)
+    aCenters = oRandom.random((500, 64)) < 0.5
+    aHashes = np.repeat(aCenters, 4, axis=0)
+    return aHashes ^ (oRandom.random(aHashes.shape) < 0.05)
+
+
+def get_brute_force_distances(aHashes, aQueryHash):
+    return np.rint(hamming_distance_matrix(aQueryHash[np.newaxis], aHashes)[0] * aHashes.shape[1]).astype(int)
+
+
+@pytest.mark.parametrize("lNrOfSubstrings", [1, 4, 5])
+def test_search_radius_equals_brute_force(aHashes, lNrOfSubstrings):
+    oIndex = HammingIndex(aHashes, lNrOfSubstrings)
+    for aQueryHash in aHashes[::97]:
+        aDistances = get_brute_force_distances(aHashes, aQueryHash)
+        for lRadius in [0, 3, 8, 20, 64]:
+            aRows, aFound = oIndex.search_radius(aQueryHash, lRadius)
+            aExpected = np.flatnonzero(aDistances <= lRadius)
+            assert sorted(aRows) == aExpected.tolist()
+            assert np.array_equal(aFound, aDistances[aRows])
+            assert np.all(np.diff(aFound) >= 0)
+
+
+@pytest.mark.parametrize("lNrOfSubstrings", [1, 4, 5])
+def test_search_knn_equals_brute_force(aHashes, lNrOfSubstrings):
+    oIndex = HammingIndex(aHashes, lNrOfSubstrings)
+    for aQueryHash in aHashes[::97]:
+        aDistances = get_brute_force_distances(aHashes, aQueryHash)
+        for lK in [1, 3, 10, 100, len(aHashes) + 1]:
+            aRows, aFound = oIndex.search_knn(aQueryHash, lK)
+            # ties in the order of the rows
+            aExpected = np.lexsort((np.arange(len(aHashes)), aDistances))[:lK]
+            assert aRows == aExpected.tolist()
+            assert np.array_equal(aFound, aDistances[aExpected])
+
+
+def test_search_is_faster_than_brute_force():
+    oRandom = np.random.default_rng(1)
+    aHashes = oRandom.random((200000, 64)) < 0.5
+    aQueries = aHashes[:20] ^ (oRandom.random((20, 64)) < 0.05)
+    oIndex = HammingIndex(aHashes)
+
+    dStart = time.perf_counter()
+    for aQueryHash in aQueries:
+        oIndex.search_knn(aQueryHash, 10)
+        oIndex.search_radius(aQueryHash, 8)
+    dIndex = time.perf_counter() - dStart
+    dStart = time.perf_counter()
+    for aQueryHash in aQueries:
+        hamming_distance_matrix(aQueryHash[np.newaxis], aHashes)
+    dBruteForce = time.perf_counter() - dStart
+    assert dIndex < dBruteForce
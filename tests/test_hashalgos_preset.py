@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from twizzle import deviation_presets, hashalgos_preset
+
+# single image hash, batch hash and parameters checked
+BATCH_HASHES = [
+    (hashalgos_preset.average_hash, hashalgos_preset.average_hash_batch, [{"hash_size": 8}, {"hash_size": 16}]),
+    (hashalgos_preset.dhash, hashalgos_preset.dhash_batch, [{"hash_size": 8}, {"hash_size": 16}]),
+    (hashalgos_preset.phash, hashalgos_preset.phash_batch, [{"hash_size": 8}, {"hash_size": 16}]),
+    (hashalgos_preset.whash, hashalgos_preset.whash_batch, [{"hash_size": 8}, {"hash_size": 16}]),
+    (hashalgos_preset.block_mean_hash, hashalgos_preset.block_mean_hash_batch,
+     [{"hash_size": 8, "block_size": 8}, {"hash_size": 8, "block_size": 8, "overlapping": True}]),
+]
+
+
+def assert_batch_equals_single(aImages, fnHash, fnHashBatch, aParameters):
+    """checks a batch hash on a stack of equally sized images and a list of images of different sizes"""
+    aStack = np.stack([image[:256, :256] for image in aImages])
+    for dicParameters in aParameters:
+        for images in (aStack, aImages):
+            aHashes = fnHashBatch(images, **dicParameters)
+            for i, image in enumerate(images):
+                assert np.array_equal(aHashes[i], np.ravel(fnHash(image, **dicParameters)))
+
+
+@pytest.mark.parametrize("fnHash, fnHashBatch, aParameters", BATCH_HASHES)
+def test_batch_hash_equals_single_hash(aImages, fnHash, fnHashBatch, aParameters):
+    assert_batch_equals_single(aImages, fnHash, fnHashBatch, aParameters)
+
+
+@pytest.mark.parametrize("lBits", [1, 63, 64, 65, 256])
+def test_pack_hash_is_lossless(lBits):
+    aHashes = np.random.default_rng(lBits).random((5, lBits)) < 0.5
+    aPacked = hashalgos_preset.pack_hash(aHashes)
+    assert aPacked.dtype == np.uint64 and aPacked.shape == (5, -(-lBits // 64))
+    assert np.array_equal(hashalgos_preset.unpack_hash(aPacked, lBits), aHashes)
+    assert np.array_equal(hashalgos_preset.unpack_hash(hashalgos_preset.pack_hash(aHashes[0]), lBits), aHashes[0])
+    for i in range(1, len(aHashes)):
+        assert deviation_presets.hamming_distance_packed(aPacked[0], aPacked[i], lBits) == \
+            deviation_presets.hamming_distance(aHashes[0], aHashes[i])
+
+
+# most bits differing between multi_size_hash_batch and the hash function on the example images
+MULTI_SIZE_TOLERANCES = [
+    (hashalgos_preset.dhash, {}, {8: 1, 16: 2, 32: 0}),
+    (hashalgos_preset.average_hash, {}, {8: 0, 16: 0, 32: 0}),
+    (hashalgos_preset.phash, {}, {8: 0, 16: 0, 32: 0}),
+    (hashalgos_preset.whash, {}, {8: 0, 16: 0, 32: 0}),
+    (hashalgos_preset.block_mean_hash, {"block_size": 8}, {4: 0, 8: 0, 16: 0}),
+]
+
+
+@pytest.mark.parametrize("fnHash, dicParameters, dicTolerances", MULTI_SIZE_TOLERANCES)
+def test_multi_size_hash_is_within_tolerance(aImages, fnHash, dicParameters, dicTolerances):
+    dicHashes = hashalgos_preset.multi_size_hash_batch(aImages, fnHash, list(dicTolerances), **dicParameters)
+    assert sorted(dicHashes) == sorted(dicTolerances)
+    for lHashSize, aHashes in dicHashes.items():
+        for i, image in enumerate(aImages):
+            aHash = np.ravel(fnHash(image, hash_size=lHashSize, **dicParameters))
+            assert np.count_nonzero(aHashes[i] != aHash) <= dicTolerances[lHashSize]
+    dicHashes = hashalgos_preset.multi_size_hash(aImages[0], fnHash, list(dicTolerances), **dicParameters)
+    assert all(aHash.ndim == 1 for aHash in dicHashes.values())
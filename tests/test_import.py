@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+# modules `import twizzle` must not load, they are imported by the functions using them
+HEAVY_MODULES = ["cv2", "pandas", "skimage", "blend_modes"]
+
+IMPORT_SCRIPT = """
+import sys
+import twizzle
+print(",".join(s for s in %r if s in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+def test_import_does_not_load_heavy_modules():
+    # a fresh interpreter, as the other tests import the heavy modules
+    sOutput = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], universal_newlines=True,
+                                      cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert sOutput.strip() == ""
+
+
+def test_public_names_are_resolved_lazily():
+    import twizzle
+    for sName in twizzle.__all__:
+        assert getattr(twizzle, sName) is not None
+    assert set(twizzle.__all__) <= set(dir(twizzle))
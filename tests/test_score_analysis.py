@@ -0,0 +1,68 @@
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from twizzle import score_analysis
+
+
+@pytest.fixture(params=[0, 1, 2])
+def tpScores(request):
+    """scores with ties and NaN scores and the target decisions of the pairs"""
+    oRandom = np.random.default_rng(request.param)
+    aTargetDecisions = oRandom.random(300) < 0.4
+    aScores = np.round(oRandom.normal(np.where(aTargetDecisions, 0.3, 0.6), 0.15), 2)
+    aScores[oRandom.random(300) < 0.02] = np.nan
+    return aScores, aTargetDecisions
+
+
+def get_brute_force_rates(aScores, aTargetDecisions, dThreshold):
+    """FAR and FRR of deciding every pair having a score of at most dThreshold to be the same"""
+    aAccepted = aScores <= dThreshold
+    return (np.count_nonzero(aAccepted & ~aTargetDecisions) / np.count_nonzero(~aTargetDecisions),
+            np.count_nonzero(~aAccepted & aTargetDecisions) / np.count_nonzero(aTargetDecisions))
+
+
+def test_roc_equals_brute_force(tpScores):
+    aScores, aTargetDecisions = tpScores
+    dicRoc = score_analysis.compute_roc(aScores, aTargetDecisions)
+    aValidScores = aScores[~np.isnan(aScores)]
+    assert np.array_equal(dicRoc["thresholds"], np.concatenate(([-np.inf], np.unique(aValidScores))))
+    for dThreshold, dFAR, dFRR in zip(dicRoc["thresholds"], dicRoc["FAR"], dicRoc["FRR"]):
+        assert (dFAR, dFRR) == pytest.approx(get_brute_force_rates(aScores, aTargetDecisions, dThreshold))
+
+
+def test_auc_equals_brute_force(tpScores):
+    aScores, aTargetDecisions = tpScores
+    # pairs are accepted with low scores, NaN scores are never accepted
+    aScores = np.where(np.isnan(aScores), np.inf, aScores)
+    aPositives, aNegatives = aScores[aTargetDecisions], aScores[~aTargetDecisions]
+    dAUC = np.mean((aPositives[:, np.newaxis] < aNegatives[np.newaxis, :]) +
+                   0.5 * (aPositives[:, np.newaxis] == aNegatives[np.newaxis, :]))
+    dicRoc = score_analysis.compute_roc(tpScores[0], aTargetDecisions)
+    assert score_analysis.compute_auc(dicRoc) == pytest.approx(dAUC)
+
+
+def test_eer_equals_brute_force(tpScores):
+    aScores, aTargetDecisions = tpScores
+    dicRoc = score_analysis.compute_roc(aScores, aTargetDecisions)
+    dEER, dThreshold = score_analysis.compute_eer(dicRoc)
+    # the first threshold accepting at least as many different pairs as it rejects same pairs
+    aThresholds = [dT for dT in dicRoc["thresholds"]
+                   if np.subtract(*get_brute_force_rates(aScores, aTargetDecisions, dT)) >= 0]
+    assert dThreshold == aThresholds[0]
+    dFAR, dFRR = get_brute_force_rates(aScores, aTargetDecisions, dThreshold)
+    i = list(dicRoc["thresholds"]).index(dThreshold)
+    dPreviousFAR, dPreviousFRR = get_brute_force_rates(aScores, aTargetDecisions, dicRoc["thresholds"][i - 1])
+    # the crossing lies between the two operating points
+    assert min(dPreviousFAR, dFAR) <= dEER <= max(dPreviousFAR, dFAR)
+    assert min(dPreviousFRR, dFRR) <= dEER <= max(dPreviousFRR, dFRR)
+
+
+def test_probit_equals_normal_quantile():
+    aP = np.concatenate(([1e-9, 0.02425, 0.5, 0.97575, 1 - 1e-9], np.linspace(1e-6, 1 - 1e-6, 10001)))
+    aExpected = np.array([NormalDist().inv_cdf(dP) for dP in aP])
+    assert np.allclose(score_analysis.probit(aP), aExpected, rtol=1.2e-9, atol=1e-12)
+    dicDet = score_analysis.compute_det({"thresholds": np.arange(3), "FAR": np.array([0.0, 0.5, 1.0]),
+                                         "FRR": np.array([1.0, 0.5, 0.0])})
+    assert np.allclose(dicDet["FAR"], [NormalDist().inv_cdf(1e-9), 0, NormalDist().inv_cdf(1 - 1e-9)])
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from twizzle import Twizzle
+from twizzle import storage
+
+from conftest import CHALLENGE_NAME, get_pairs
+
+
+def fill_sqlitedict_database(sDBPath):
+    """database of the SqliteDict storage having two challenges and tests with fingerprints and pair data"""
+    tw = Twizzle(sDBPath)
+    tw.add_challenge(CHALLENGE_NAME, *get_pairs())
+    tw.add_challenge("small", ["a.png", "b.png"], ["a.png", "c.png"], [True, False], {"attack": "none"})
+    dicTest = tw.evaluate_decisions(tw.get_challenge("small"), [True, True], {"threshold": 1})
+    tw.attach_pair_data([dicTest], aDecisions=[True, True])
+    tw.save_tests([dicTest, {"challenge": "small", "errorrate": 0.5}], ["fingerprint1", None])
+    tw.close()
+
+
+def test_migration_keeps_challenges_and_tests(tmp_path):
+    sDBPath = str(tmp_path / "test.db")
+    fill_sqlitedict_database(sDBPath)
+    twSource = Twizzle(sDBPath)
+    assert storage.migrate_sqlitedict_to_sqlite(sDBPath) == 2
+    twTarget = Twizzle(sDBPath, sStorage=storage.STORAGE_SQLITE)
+    assert sorted(twTarget.get_challenges(), key=str) == sorted(twSource.get_challenges(), key=str)
+    for sName in [CHALLENGE_NAME, "small"]:
+        assert twTarget.get_challenge(sName) == twSource.get_challenge(sName)
+    assert twTarget.get_tests() == twSource.get_tests()
+    assert twTarget.has_test("fingerprint1")
+    assert twTarget.get_tests_by_fingerprint("fingerprint1") == twSource.get_tests_by_fingerprint("fingerprint1")
+    dicTest = twTarget.get_tests()[0]
+    assert list(twTarget.get_pair_data(dicTest)["decisions"]) == [1, 1]
+    twSource.close()
+    twTarget.close()
+
+
+def test_failed_migration_leaves_target_untouched(tmp_path):
+    sDBPath = str(tmp_path / "test.db")
+    sTargetPath = str(tmp_path / "target.db")
+    fill_sqlitedict_database(sDBPath)
+    twTarget = Twizzle(sTargetPath, sStorage=storage.STORAGE_SQLITE)
+    twTarget.add_challenge("small", ["x.png"], ["y.png"], [True])
+    twTarget.close()
+
+    # the second challenge already exists in the target
+    with pytest.raises(Exception):
+        storage.migrate_sqlitedict_to_sqlite(sDBPath, sTargetPath)
+    twTarget = Twizzle(sTargetPath, sStorage=storage.STORAGE_SQLITE)
+    assert [dic["challenge"] for dic in twTarget.get_challenges()] == ["small"]
+    assert twTarget.get_tests() == []
+    twTarget.del_challenge("small")
+
+    # a second run migrates everything
+    assert storage.migrate_sqlitedict_to_sqlite(sDBPath, sTargetPath) == 2
+    assert len(twTarget.get_challenges()) == 2
+    assert len(twTarget.get_tests()) == 2
+    twTarget.close()
+
+
+def test_close_closes_the_connections(tmp_path):
+    tw = Twizzle(str(tmp_path / "test.db"), sStorage=storage.STORAGE_SQLITE)
+    tw.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        tw.get_tests()
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+from threading import Thread
+
+import pytest
+
+from twizzle import Twizzle
+from twizzle import test_runner
+
+from conftest import CHALLENGE_NAME, IMAGE_PATHS, THRESHOLDS, dhash_decisions, dhash_scores, get_pairs
+
+
+def run_tests(sDBPath, **dicRunnerParameters):
+    """runs dhash_decisions for all thresholds and returns the saved tests ordered by threshold"""
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, **dicRunnerParameters)
+    for dThreshold in THRESHOLDS:
+        oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions, {"dThreshold": dThreshold})
+    oRunner.close()
+    return sorted(oRunner.get_tests(), key=lambda dicTest: dicTest["threshold"])
+
+
+def test_thresholds_give_different_tests(sDBPath):
+    aTests = run_tests(sDBPath)
+    assert len(IMAGE_PATHS) > 1
+    assert len(set(dicTest["errorrate"] for dicTest in aTests)) == len(THRESHOLDS)
+
+
+def test_sharded_tests_equal_unsharded_tests(sDBPath):
+    aTests = run_tests(sDBPath)
+    Twizzle(sDBPath).clear_tests()
+    assert run_tests(sDBPath, lShardSize=7) == aTests
+
+
+def fail(aOriginalObjects, aComparativeObjects):
+    raise ValueError("callback failed")
+
+
+def test_streamed_tests_with_limit_are_all_yielded(sDBPath):
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, bStreamTests=True, lMaxTestsInFlight=2)
+    aThresholds = [0.1 * i for i in range(6)]
+
+    def add_tests():
+        try:
+            for dThreshold in aThresholds:
+                oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions, {"dThreshold": dThreshold})
+        finally:
+            oRunner.finish_submitting()
+
+    oProducer = Thread(target=add_tests)
+    oProducer.start()
+    aStreamed = [dicTest["threshold"] for dicTest in oRunner.iter_finished_tests()]
+    oProducer.join()
+    oRunner.close()
+    assert sorted(aStreamed) == aThresholds
+    assert len(oRunner.get_tests()) == len(aThresholds)
+
+
+def test_streamed_errors_are_raised_once(sDBPath):
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, bStreamTests=True)
+    oRunner.run_test_async(CHALLENGE_NAME, fail)
+    oRunner.finish_submitting()
+    with pytest.raises(ValueError):
+        list(oRunner.iter_finished_tests())
+    oRunner.close()
+    with pytest.raises(Exception):
+        oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions)
+
+
+def test_streamed_errors_are_raised_without_iterating(sDBPath):
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, bStreamTests=True)
+    oRunner.run_test_async(CHALLENGE_NAME, fail)
+    with pytest.raises(ValueError):
+        oRunner.close()
+
+
+def test_process_backend_equals_thread_backend(sDBPath):
+    aTests = run_tests(sDBPath)
+    Twizzle(sDBPath).clear_tests()
+    assert run_tests(sDBPath, sBackend="process") == aTests
+
+
+class Unidentifiable(object):
+    pass
+
+
+@pytest.mark.parametrize("sStorage", ["sqlitedict", "sqlite"])
+def test_resumed_sweep_skips_saved_tests(tmp_path, sStorage):
+    sDBPath = str(tmp_path / "test.db")
+    Twizzle(sDBPath, sStorage).add_challenge(CHALLENGE_NAME, *get_pairs())
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, sStorage=sStorage, bSkipExistingTests=True)
+    oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions, {"dThreshold": THRESHOLDS[0]})
+    oRunner.run_threshold_sweep_async(CHALLENGE_NAME, dhash_scores, THRESHOLDS[:2])
+    oRunner.close()
+    aTests = oRunner.get_tests()
+    assert len(aTests) == 3
+
+    # the restarted sweep only runs the tests that were not saved yet
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=2, sStorage=sStorage, bSkipExistingTests=True,
+                                     bStreamTests=True)
+    for dThreshold in THRESHOLDS:
+        oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions, {"dThreshold": dThreshold})
+    oRunner.run_threshold_sweep_async(CHALLENGE_NAME, dhash_scores, THRESHOLDS[:2])
+    oRunner.finish_submitting()
+    aStreamed = list(oRunner.iter_finished_tests())
+    oRunner.close()
+    assert len(aStreamed) == len(THRESHOLDS) + 2
+    assert oRunner.get_tests()[:3] == aTests
+    assert len(oRunner.get_tests()) == len(THRESHOLDS) + 2
+
+    tw = Twizzle(sDBPath, sStorage)
+    dicTest = tw.run_test(CHALLENGE_NAME, dhash_decisions, {"dThreshold": THRESHOLDS[0]}, bSkipExisting=True)
+    assert dicTest == aTests[0]
+    assert len(tw.get_tests()) == len(THRESHOLDS) + 2
+
+
+def test_fingerprints_are_stable_across_interpreters(sDBPath):
+    sScript = ("from twizzle import Twizzle\n"
+               "from conftest import dhash_decisions\n"
+               "print(Twizzle(%r).get_test_fingerprint('c', dhash_decisions, {'dThreshold': 0.1, 'a': [1, 2]}))"
+               % sDBPath)
+    sFingerprint = subprocess.check_output([sys.executable, "-c", sScript], universal_newlines=True,
+                                           cwd=os.path.dirname(os.path.abspath(__file__)),
+                                           env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    tw = Twizzle(sDBPath)
+    assert sFingerprint.strip() == tw.get_test_fingerprint("c", dhash_decisions, {"a": [1, 2], "dThreshold": 0.1})
+    assert tw.get_test_fingerprint("c", dhash_decisions, {"dThreshold": 0.2}) != \
+        tw.get_test_fingerprint("c", dhash_decisions, {"dThreshold": 0.1})
+
+
+def test_unidentifiable_parameters_can_not_be_skipped(sDBPath):
+    tw = Twizzle(sDBPath)
+    assert tw.get_test_fingerprint("c", dhash_decisions, {"o": Unidentifiable()}, bRequired=False) is None
+    with pytest.raises(Exception):
+        tw.get_test_fingerprint("c", dhash_decisions, {"o": Unidentifiable()})
+    oRunner = test_runner.TestRunner(sDBPath, lNrOfThreads=1, bSkipExistingTests=True)
+    with pytest.raises(Exception):
+        oRunner.run_test_async(CHALLENGE_NAME, dhash_decisions, {"o": Unidentifiable()})
+    oRunner.close()
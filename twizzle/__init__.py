@@ -1,7 +1,33 @@
-from twizzle.twizzle import Twizzle
-from twizzle.analysis_data_generator import AnalysisDataGenerator
-from twizzle.test_runner import TestRunner
-import twizzle.attacks_preset as attacks_preset
-import twizzle.utils as utils
-import twizzle.deviation_presets as deviation_presets
-import twizzle.hashalgos_preset as hashalgos_preset
+import importlib
+
+# public names and the modules defining them, imported on first access so that
+# `import twizzle` does not load OpenCV, scikit-image, pandas or blend_modes
+_PUBLIC_CLASSES = {
+    "Twizzle": "twizzle.twizzle",
+    "AnalysisDataGenerator": "twizzle.analysis_data_generator",
+    "TestRunner": "twizzle.test_runner",
+    "FeatureCache": "twizzle.feature_cache",
+    "HammingIndex": "twizzle.hamming_index",
+    "CompactChallenge": "twizzle.compact_challenge",
+}
+_PUBLIC_MODULES = ("attacks_preset", "utils", "deviation_presets",
+                   "hashalgos_preset", "score_analysis", "metrics")
+
+__all__ = list(_PUBLIC_CLASSES) + list(_PUBLIC_MODULES)
+
+
+def __getattr__(sName):
+    """ imports public classes and preset modules when they are accessed first """
+    if sName in _PUBLIC_CLASSES:
+        oValue = getattr(importlib.import_module(_PUBLIC_CLASSES[sName]), sName)
+    elif sName in _PUBLIC_MODULES:
+        oValue = importlib.import_module("twizzle." + sName)
+    else:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, sName))
+    globals()[sName] = oValue
+    return oValue
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
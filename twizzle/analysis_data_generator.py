@@ -1,13 +1,14 @@
 
 import pandas as pd
 from twizzle import Twizzle
+from twizzle.storage import STORAGE_SQLITEDICT
 
 
 class AnalysisDataGenerator(object):
     """Generator for analysis data in pandas format
     """
 
-    def __init__(self, sDBPath):
+    def __init__(self, sDBPath, sStorage=STORAGE_SQLITEDICT):
         """Constructor of the AnalysisDataGenerator class
 
         Note:
@@ -15,10 +16,11 @@ class AnalysisDataGenerator(object):
             as parameter
         Args:
             sDBPath (str): Path to the SQLite database.
+            sStorage (str): challenge storage of the database, see `Twizzle`
         """
         if sDBPath is None:
             raise Exception("Path to SQL-Database has to be defined")
-        tw = Twizzle(sDBPath)
+        tw = Twizzle(sDBPath, sStorage)
         dfChallenges = pd.DataFrame(tw.get_challenges())
         if dfChallenges.empty:
             raise Exception("currently there are no challenges defined yet")
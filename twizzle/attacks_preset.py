@@ -10,11 +10,7 @@ import numpy as np
 
 import cv2
 # from scipy import ndimage
-from skimage import exposure
-import blend_modes
-from skimage import util
-from skimage import img_as_float
-from skimage import img_as_ubyte
+# scikit-image and blend_modes are imported by the attacks using them
 import math
 
 
@@ -203,6 +199,7 @@ def contrast(aInputImage, lContrast=50):
     """
     if abs(lContrast) > 128:
         raise Exception("contrast value have to be in range [-128, 128]")
+    from skimage import exposure
     if lContrast >= 0:
         return exposure.rescale_intensity(aInputImage, in_range=(0 + lContrast, 255 - lContrast))
     else:
@@ -242,6 +239,7 @@ def blend_image(aInputImage, aBGImage, dOpacity=1.0, sBlendMode="mul"):
     aInputImageAlpha = __add_alpha_channel(aInputImage)
     aBGImageAlpha = __add_alpha_channel(aBGImage)
 
+    import blend_modes
     dicBlendModes = {
         "sl": blend_modes.soft_light,
         "lo": blend_modes.lighten_only,
@@ -305,6 +303,7 @@ def __remove_alpha_channel(aInputImage):
 
 def gamma_adjustment(aInputImage, dGamma=1.0, dGain=1.0):
     """ adapts the gamma exposure """
+    from skimage import exposure
     return exposure.adjust_gamma(aInputImage, dGamma, dGain)
 
 
@@ -339,6 +338,7 @@ def jpeg_compression(aInputImage, lJPEGQuality=95):
 
 def speckle_noise(aInputImage, dSigma=0.001):
     """ adds speckle noise """
+    from skimage import util, img_as_float, img_as_ubyte
     image = img_as_float(aInputImage)
     image = util.random_noise(aInputImage, 'speckle', mean=0, var=dSigma)
     return img_as_ubyte(image)
@@ -346,6 +346,7 @@ def speckle_noise(aInputImage, dSigma=0.001):
 
 def salt_and_pepper_noise(aInputImage, dAmount=0.001, dProportion=0.5):
     """ adds salt and pepper noise """
+    from skimage import util, img_as_float, img_as_ubyte
     image = img_as_float(aInputImage)
     image = util.random_noise(
         aInputImage, 's&p', amount=dAmount, salt_vs_pepper=dProportion)
@@ -354,6 +355,7 @@ def salt_and_pepper_noise(aInputImage, dAmount=0.001, dProportion=0.5):
 
 def gauss_noise(aInputImage, dSigma=0.1):
     """adds gaussian noise with skimage """
+    from skimage import util, img_as_float, img_as_ubyte
     image = img_as_float(aInputImage)
     image = util.random_noise(image, 'gaussian', mean=0, var=dSigma)
     return img_as_ubyte(image)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+"""
+This module defines a compact, array based representation of challenges and a snapshot
+format of it that can be memory-mapped
+"""
+
+from collections.abc import Sequence
+import hashlib
+import os
+import pickle
+import shutil
+import uuid
+
+import numpy as np
+
+# keys of a challenge object that are stored in the arrays, the other keys are metadata
+CHALLENGE_PAIR_KEYS = ("challenge", "originalObjects",
+                       "comparativeObjects", "targetDecisions")
+
+# terminates every path of the path table
+PATH_SEPARATOR = "\0"
+
+# files of a snapshot directory
+SNAPSHOT_ARRAYS = ("path_table", "path_offsets", "originals",
+                   "comparatives", "decisions")
+SNAPSHOT_HEADER = "challenge.pickle"
+
+
+def get_snapshot_path(sSnapshotDir, sChallengeName):
+    """ returns the directory of the snapshot of a challenge inside sSnapshotDir """
+    return os.path.join(sSnapshotDir, hashlib.sha1(sChallengeName.encode("utf-8")).hexdigest())
+
+
+def remove_snapshot(sPath):
+    """ removes the snapshot sPath, i.e. the link to its directory and the directory, if there is one """
+    if os.path.islink(sPath):
+        sVersionPath = os.path.realpath(sPath)
+        os.remove(sPath)
+        shutil.rmtree(sVersionPath, ignore_errors=True)
+    elif os.path.isfile(os.path.join(sPath, SNAPSHOT_HEADER)):
+        shutil.rmtree(sPath, ignore_errors=True)
+
+
+def remove_snapshots(sSnapshotDir):
+    """ removes all snapshots inside sSnapshotDir, other files are left untouched """
+    if not os.path.isdir(sSnapshotDir):
+        return
+    for sName in os.listdir(sSnapshotDir):
+        remove_snapshot(os.path.join(sSnapshotDir, sName))
+
+
+class PathSequence(Sequence):
+    """Read-only sequence of the paths of a CompactChallenge, decoded on access
+
+    Note:
+        Slices are PathSequences again, so splitting a challenge into shards does not
+        decode any path.
+    """
+
+    def __init__(self, oCompactChallenge, aIndices):
+        """Constructor of the PathSequence class
+
+        Args:
+            oCompactChallenge (:obj:`CompactChallenge`): challenge holding the path table
+            aIndices (numpy.ndarray): path indices of the elements of the sequence
+        """
+        self.oCompactChallenge = oCompactChallenge
+        self.aIndices = aIndices
+
+    def __len__(self):
+        return len(self.aIndices)
+
+    def __getitem__(self, oIndex):
+        if isinstance(oIndex, slice):
+            return PathSequence(self.oCompactChallenge, self.aIndices[oIndex])
+        return self.oCompactChallenge.get_path(int(self.aIndices[oIndex]))
+
+    def __iter__(self):
+        for lIndex in self.aIndices.tolist():
+            yield self.oCompactChallenge.get_path(lIndex)
+
+    def __eq__(self, oOther):
+        if isinstance(oOther, (PathSequence, list, tuple)):
+            return len(self) == len(oOther) and all(a == b for a, b in zip(self, oOther))
+        return NotImplemented
+
+    def __repr__(self):
+        return "PathSequence(%d paths)" % len(self)
+
+    def __reduce__(self):
+        # sent to other processes as list, not as the whole path table
+        return (list, (list(self),))
+
+
+class DecisionSequence(Sequence):
+    """Read-only sequence of the bit packed target decisions of a CompactChallenge
+
+    Note:
+        Single decisions are unpacked on access, `numpy.asarray` unpacks all decisions
+        at once into a boolean array.
+    """
+
+    # number of decisions unpacked at once while iterating
+    ITERATION_CHUNK = 1 << 16
+
+    def __init__(self, aPackedDecisions, lSize):
+        """Constructor of the DecisionSequence class
+
+        Args:
+            aPackedDecisions (numpy.ndarray): target decisions packed by `numpy.packbits`
+            lSize (int): number of decisions
+        """
+        self.aPackedDecisions = aPackedDecisions
+        self.lSize = lSize
+
+    def __len__(self):
+        return self.lSize
+
+    def __getitem__(self, oIndex):
+        if isinstance(oIndex, slice):
+            return self.__array__()[oIndex]
+        lIndex = range(self.lSize)[oIndex]
+        return bool((int(self.aPackedDecisions[lIndex >> 3]) >> (7 - (lIndex & 7))) & 1)
+
+    def __iter__(self):
+        for lStart in range(0, self.lSize, self.ITERATION_CHUNK):
+            lCount = min(self.ITERATION_CHUNK, self.lSize - lStart)
+            yield from np.unpackbits(self.aPackedDecisions[lStart >> 3:(lStart + lCount + 7) >> 3],
+                                     count=lCount).astype(bool).tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        aDecisions = np.unpackbits(
+            self.aPackedDecisions, count=self.lSize).astype(bool)
+        return aDecisions if dtype is None else aDecisions.astype(dtype, copy=False)
+
+    def __eq__(self, oOther):
+        if isinstance(oOther, (DecisionSequence, list, tuple)):
+            return len(self) == len(oOther) and all(a == b for a, b in zip(self, oOther))
+        return NotImplemented
+
+    def __repr__(self):
+        return "DecisionSequence(%d decisions)" % len(self)
+
+    def __reduce__(self):
+        # sent to other processes as list, not as the mapped array
+        return (list, (self.__array__().tolist(),))
+
+
+class CompactChallenge(object):
+    """Challenge stored as a few flat arrays instead of lists of paths and booleans
+
+    Note:
+        Every distinct path is stored once in a path table: the UTF-8 encoded paths,
+        each terminated by a NUL byte, and the offset at which every path starts.
+        Original and comparative objects are int32 indices into this table and the
+        target decisions are packed into bits. A pair thus costs 8 bytes and one bit.
+    """
+
+    def __init__(self, sName, aPathTable, aPathOffsets, aOriginalIndices, aComparativeIndices,
+                 aPackedDecisions, lSize, dicMetadata=None, bDecisionsAsArray=False, sVersion=None):
+        """Constructor of the CompactChallenge class
+
+        Args:
+            sName (str): the name of the challenge
+            aPathTable (numpy.ndarray): uint8 array of the NUL terminated UTF-8 encoded paths
+            aPathOffsets (numpy.ndarray): int64 array of the start of every path and the end of the table
+            aOriginalIndices (numpy.ndarray): int32 path index of the original object of every pair
+            aComparativeIndices (numpy.ndarray): int32 path index of the comparative object of every pair
+            aPackedDecisions (numpy.ndarray): target decisions packed by `numpy.packbits`
+            lSize (int): number of pairs
+            dicMetadata (:obj:): metadata of the challenge
+            bDecisionsAsArray (bool): return the target decisions as array instead of list in `to_challenge`
+            sVersion (str): version of the challenge in the database, stored with snapshots
+        """
+        self.sName = sName
+        self.aPathTable = aPathTable
+        self.aPathOffsets = aPathOffsets
+        self.aOriginalIndices = aOriginalIndices
+        self.aComparativeIndices = aComparativeIndices
+        self.aPackedDecisions = aPackedDecisions
+        self.lSize = lSize
+        self.dicMetadata = dicMetadata if dicMetadata is not None else {}
+        self.bDecisionsAsArray = bDecisionsAsArray
+        self.sVersion = sVersion
+        self._aPaths = None
+
+    @classmethod
+    def from_challenge(cls, dicChallenge):
+        """ creates the compact representation of a challenge object as returned by `Twizzle.get_challenge` """
+        dicPathIndices = {}
+        aOriginalIndices = np.fromiter(
+            (dicPathIndices.setdefault(sPath, len(dicPathIndices))
+             for sPath in dicChallenge["originalObjects"]),
+            dtype=np.int32, count=len(dicChallenge["originalObjects"]))
+        aComparativeIndices = np.fromiter(
+            (dicPathIndices.setdefault(sPath, len(dicPathIndices))
+             for sPath in dicChallenge["comparativeObjects"]),
+            dtype=np.int32, count=len(dicChallenge["comparativeObjects"]))
+        if any(PATH_SEPARATOR in sPath for sPath in dicPathIndices):
+            raise Exception("Paths must not contain NUL characters.")
+
+        aEncodedPaths = [(sPath + PATH_SEPARATOR).encode("utf-8")
+                         for sPath in dicPathIndices]
+        aPathOffsets = np.zeros(len(aEncodedPaths) + 1, dtype=np.int64)
+        np.cumsum([len(bPath) for bPath in aEncodedPaths],
+                  out=aPathOffsets[1:])
+        aPathTable = np.frombuffer(b"".join(aEncodedPaths), dtype=np.uint8)
+
+        aTargetDecisions = dicChallenge["targetDecisions"]
+        dicMetadata = {k: v for k, v in dicChallenge.items()
+                       if k not in CHALLENGE_PAIR_KEYS}
+        return cls(dicChallenge["challenge"], aPathTable, aPathOffsets, aOriginalIndices, aComparativeIndices,
+                   np.packbits(np.asarray(aTargetDecisions, dtype=bool)), len(
+                       aTargetDecisions), dicMetadata,
+                   isinstance(aTargetDecisions, np.ndarray))
+
+    def __len__(self):
+        return self.lSize
+
+    def get_nbytes(self):
+        """ returns the number of bytes of the arrays """
+        return sum(a.nbytes for a in (self.aPathTable, self.aPathOffsets, self.aOriginalIndices,
+                                      self.aComparativeIndices, self.aPackedDecisions))
+
+    def get_path(self, lIndex):
+        """ returns a single path of the path table """
+        return self.aPathTable[self.aPathOffsets[lIndex]:self.aPathOffsets[lIndex + 1] - 1].tobytes().decode("utf-8")
+
+    def get_paths(self):
+        """ returns all paths of the path table, decoded once and cached """
+        if self._aPaths is None:
+            self._aPaths = self.aPathTable.tobytes().decode(
+                "utf-8").split(PATH_SEPARATOR)[:-1]
+        return self._aPaths
+
+    def get_original_objects(self):
+        """ returns the list of paths of the original objects """
+        aPaths = self.get_paths()
+        return [aPaths[i] for i in self.aOriginalIndices.tolist()]
+
+    def get_comparative_objects(self):
+        """ returns the list of paths of the comparative objects """
+        aPaths = self.get_paths()
+        return [aPaths[i] for i in self.aComparativeIndices.tolist()]
+
+    def get_target_decisions(self):
+        """ returns the target decisions as boolean array """
+        return np.unpackbits(self.aPackedDecisions, count=self.lSize).astype(bool)
+
+    def to_challenge(self, bLazy=False):
+        """ returns the challenge object like `Twizzle.get_challenge`
+
+        Args:
+            bLazy (bool): return the objects as PathSequences decoding the paths on access
+                          and the target decisions as DecisionSequence unpacking them on access
+                          instead of lists, so no array is read
+        """
+        dicChallenge = dict(self.dicMetadata)
+        dicChallenge["challenge"] = self.sName
+        if bLazy:
+            dicChallenge["originalObjects"] = PathSequence(
+                self, self.aOriginalIndices)
+            dicChallenge["comparativeObjects"] = PathSequence(
+                self, self.aComparativeIndices)
+            dicChallenge["targetDecisions"] = DecisionSequence(
+                self.aPackedDecisions, self.lSize)
+            return dicChallenge
+        dicChallenge["originalObjects"] = self.get_original_objects()
+        dicChallenge["comparativeObjects"] = self.get_comparative_objects()
+        aTargetDecisions = self.get_target_decisions()
+        dicChallenge["targetDecisions"] = aTargetDecisions if self.bDecisionsAsArray else aTargetDecisions.tolist()
+        return dicChallenge
+
+    def save_snapshot(self, sPath):
+        """ writes the challenge to a snapshot that can be memory-mapped by `load_snapshot`
+
+        Note:
+            The arrays are written as .npy files next to a pickled header holding the
+            name, size, metadata and version into a new directory. sPath is a symbolic
+            link to it, which is replaced atomically, so readers always see a complete
+            snapshot. The directory of a replaced snapshot is removed afterwards.
+
+        Args:
+            sPath (str): path of the snapshot
+        """
+        sVersionPath = "%s.%s" % (sPath, uuid.uuid4().hex)
+        sLinkPath = sVersionPath + ".link"
+        os.makedirs(sVersionPath)
+        try:
+            for sArray, aArray in zip(SNAPSHOT_ARRAYS, (self.aPathTable, self.aPathOffsets, self.aOriginalIndices,
+                                                        self.aComparativeIndices, self.aPackedDecisions)):
+                np.save(os.path.join(sVersionPath, sArray + ".npy"),
+                        np.ascontiguousarray(aArray))
+            with open(os.path.join(sVersionPath, SNAPSHOT_HEADER), "wb") as f:
+                pickle.dump({"challenge": self.sName, "size": self.lSize, "metadata": self.dicMetadata,
+                             "decisions_as_array": self.bDecisionsAsArray, "version": self.sVersion},
+                            f, pickle.HIGHEST_PROTOCOL)
+            # relative link, so the directory of the snapshots can be moved
+            os.symlink(os.path.basename(sVersionPath), sLinkPath)
+            sOldVersionPath = None
+            if os.path.islink(sPath):
+                sOldVersionPath = os.path.realpath(sPath)
+            elif os.path.isdir(sPath):
+                # snapshots written by earlier versions are plain directories
+                shutil.rmtree(sPath)
+            os.replace(sLinkPath, sPath)
+        except Exception:
+            if os.path.islink(sLinkPath):
+                os.remove(sLinkPath)
+            shutil.rmtree(sVersionPath, ignore_errors=True)
+            raise
+        if sOldVersionPath is not None:
+            shutil.rmtree(sOldVersionPath, ignore_errors=True)
+
+    @classmethod
+    def load_snapshot(cls, sPath):
+        """ memory-maps a snapshot written by `save_snapshot` read-only
+
+        Note:
+            No array is read into memory, processes mapping the same snapshot share
+            its pages. Loading takes the same time for every challenge size.
+            If the snapshot is replaced or removed meanwhile, FileNotFoundError is raised.
+
+        Args:
+            sPath (str): path of the snapshot
+
+        Returns:
+            :obj:`CompactChallenge`: the challenge backed by the mapped arrays
+        """
+        # all files are read from the same version of the snapshot
+        sPath = os.path.realpath(sPath)
+        with open(os.path.join(sPath, SNAPSHOT_HEADER), "rb") as f:
+            dicHeader = pickle.load(f)
+        aArrays = [np.load(os.path.join(sPath, sArray + ".npy"), mmap_mode="r")
+                   for sArray in SNAPSHOT_ARRAYS]
+        return cls(dicHeader["challenge"], *aArrays, lSize=dicHeader["size"],
+                   dicMetadata=dicHeader["metadata"], bDecisionsAsArray=dicHeader["decisions_as_array"],
+                   sVersion=dicHeader.get("version"))
@@ -9,8 +9,140 @@ This module defines common functions to calculate the deviation between two hash
 import numpy as np
 
 
+# number of set bits of every byte value
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
 def hamming_distance(array1, array2):
     if (array1.size != array2.size):
         raise Exception("Arrays have to have the same size")
     hamming = array1 != array2
     return np.count_nonzero(hamming) / hamming.size
+
+
+def popcount(aWords):
+    """ returns the number of set bits in the last axis of an unsigned integer array """
+    if hasattr(np, "bitwise_count"):
+        # native popcount of numpy >= 2.0
+        return np.bitwise_count(aWords).sum(axis=-1, dtype=np.int64)
+    aWords = np.ascontiguousarray(aWords)
+    aBytes = aWords.view(np.uint8).reshape(aWords.shape[:-1] + (-1,))
+    return POPCOUNT_TABLE[aBytes].sum(axis=-1, dtype=np.int64)
+
+
+def hamming_distance_packed(array1, array2, lBits):
+    """ normalized hamming distance of two hashes packed by `hashalgos_preset.pack_hash`
+
+    Args:
+        array1 (numpy.ndarray): first packed hash
+        array2 (numpy.ndarray): second packed hash
+        lBits (int): number of bits of the unpacked hashes
+
+    Returns:
+        float: share of differing bits, equal to `hamming_distance` of the unpacked hashes
+    """
+    if (array1.shape != array2.shape):
+        raise Exception("Arrays have to have the same size")
+    return popcount(np.bitwise_xor(array1, array2)) / lBits
+
+
+def hamming_distance_batch(array1, array2):
+    """ normalized hamming distances of aligned pairs of boolean hashes
+
+    Args:
+        array1 (numpy.ndarray): (N, lBits) matrix of hashes
+        array2 (numpy.ndarray): (N, lBits) matrix of hashes
+
+    Returns:
+        numpy.ndarray: N distances, distance i is `hamming_distance(array1[i], array2[i])`
+    """
+    array1, array2 = np.asarray(array1), np.asarray(array2)
+    if (array1.shape != array2.shape or array1.ndim != 2):
+        raise Exception("Arrays have to be matrices of the same size")
+    return np.count_nonzero(array1 != array2, axis=1) / array1.shape[1]
+
+
+def hamming_distance_batch_packed(array1, array2, lBits):
+    """ normalized hamming distances of aligned pairs of packed hashes
+
+    Args:
+        array1 (numpy.ndarray): (N, lWords) matrix of packed hashes
+        array2 (numpy.ndarray): (N, lWords) matrix of packed hashes
+        lBits (int): number of bits of the unpacked hashes
+
+    Returns:
+        numpy.ndarray: N distances
+    """
+    array1, array2 = np.asarray(array1), np.asarray(array2)
+    if (array1.shape != array2.shape or array1.ndim != 2):
+        raise Exception("Arrays have to be matrices of the same size")
+    return popcount(np.bitwise_xor(array1, array2)) / lBits
+
+
+def __get_block_size(lBytesPerPair, lBytesPerRow, lMaxBytes):
+    """ number of rows of a square block of pairs whose temporary arrays fit into lMaxBytes """
+    return max(1, int(np.sqrt(lMaxBytes / (lBytesPerPair + 2 * lBytesPerRow))))
+
+
+def hamming_distance_matrix(array1, array2, lMaxBytes=256 * 1024 * 1024):
+    """ normalized hamming distances between all pairs of two sets of boolean hashes
+
+    Note:
+        The matrix is computed in blocks, so temporary arrays stay within about
+        lMaxBytes. The returned matrix itself is not part of the budget.
+
+    Args:
+        array1 (numpy.ndarray): (M, lBits) matrix of hashes
+        array2 (numpy.ndarray): (K, lBits) matrix of hashes
+        lMaxBytes (int): memory budget of temporary arrays
+
+    Returns:
+        numpy.ndarray: (M, K) matrix, entry (i, j) is `hamming_distance(array1[i], array2[j])`
+    """
+    array1, array2 = np.asarray(array1), np.asarray(array2)
+    if (array1.ndim != 2 or array2.ndim != 2 or array1.shape[1] != array2.shape[1]):
+        raise Exception("Arrays have to be matrices with the same number of columns")
+    lBits = array1.shape[1]
+    aDistances = np.empty((array1.shape[0], array2.shape[0]))
+    lBlock = __get_block_size(4, 4 * lBits, lMaxBytes)
+    for i in range(0, array1.shape[0], lBlock):
+        aBlock1 = array1[i:i + lBlock].astype(np.float32)
+        aOnes1 = aBlock1.sum(axis=1)
+        for j in range(0, array2.shape[0], lBlock):
+            aBlock2 = array2[j:j + lBlock].astype(np.float32)
+            # |a xor b| = |a| + |b| - 2 * |a and b|, exact in float32 for up to 2^24 bits
+            aCommon = aBlock1 @ aBlock2.T
+            aDistances[i:i + lBlock, j:j + lBlock] = (
+                aOnes1[:, np.newaxis] + aBlock2.sum(axis=1)[np.newaxis, :] - 2 * aCommon)
+    return aDistances / lBits
+
+
+def hamming_distance_matrix_packed(array1, array2, lBits, lMaxBytes=256 * 1024 * 1024):
+    """ normalized hamming distances between all pairs of two sets of packed hashes
+
+    Note:
+        The matrix is computed in blocks, so temporary arrays stay within about
+        lMaxBytes. The returned matrix itself is not part of the budget.
+
+    Args:
+        array1 (numpy.ndarray): (M, lWords) matrix of packed hashes
+        array2 (numpy.ndarray): (K, lWords) matrix of packed hashes
+        lBits (int): number of bits of the unpacked hashes
+        lMaxBytes (int): memory budget of temporary arrays
+
+    Returns:
+        numpy.ndarray: (M, K) matrix of distances
+    """
+    array1, array2 = np.asarray(array1), np.asarray(array2)
+    if (array1.ndim != 2 or array2.ndim != 2 or array1.shape[1] != array2.shape[1]):
+        raise Exception("Arrays have to be matrices with the same number of columns")
+    aDistances = np.empty((array1.shape[0], array2.shape[0]))
+    # xor words and their looked up bit counts per byte
+    lBlock = __get_block_size(
+        array1.shape[1] * array1.itemsize * 2 + 8, 0, lMaxBytes)
+    for i in range(0, array1.shape[0], lBlock):
+        aBlock1 = array1[i:i + lBlock, np.newaxis, :]
+        for j in range(0, array2.shape[0], lBlock):
+            aXor = np.bitwise_xor(aBlock1, array2[np.newaxis, j:j + lBlock, :])
+            aDistances[i:i + lBlock, j:j + lBlock] = popcount(aXor)
+    return aDistances / lBits
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+This module defines a cache for features (e.g. perceptual hashes) computed by callbacks,
+so parameter sweeps do not compute the same feature of an object again and again
+"""
+
+from collections import OrderedDict
+from threading import RLock
+import hashlib
+import pickle
+import sqlite3
+import json
+import os
+
+from twizzle.utils import canonical_value
+
+
+class FeatureCache(object):
+    """Two tier cache of features keyed by object, algorithm and algorithm parameters
+
+    Note:
+        The first tier is an in-memory LRU cache holding at most lMaxEntries features.
+        If sDBPath is given, features are additionally stored in a table of the
+        Twizzle database, so they survive restarts and are shared between worker
+        processes. New features are written to the database in batches of
+        lCommitEvery features; call `commit()` when done to write the rest.
+        Objects are identified by their path or, if bUseChecksum is set, by a
+        checksum of their content. Checksums are computed once per path,
+        modification time and size of a file.
+    """
+
+    def __init__(self, lMaxEntries=100000, sDBPath=None, bUseChecksum=False, lCommitEvery=1000):
+        """Constructor of the FeatureCache class
+
+        Args:
+            lMaxEntries (int): maximal number of features kept in memory
+            sDBPath (str): Path to the SQLite database used as persistent tier or None
+            bUseChecksum (bool): identify objects by the SHA1 of their content instead of their path
+            lCommitEvery (int): number of new features after which the persistent tier is committed
+        """
+        if lMaxEntries <= 0:
+            raise Exception("lMaxEntries has to be grater then 0")
+        self.lMaxEntries = lMaxEntries
+        self.bUseChecksum = bUseChecksum
+        self.lCommitEvery = lCommitEvery
+        self._lock = RLock()
+        self._dicMemory = OrderedDict()
+        self._dicPending = {}
+        # path -> ((modification time, size), checksum) of the last lMaxEntries files
+        self._dicChecksums = OrderedDict()
+        self._dicStatistics = {"memory_hits": 0,
+                               "persistent_hits": 0, "misses": 0}
+
+        self._conn = None
+        if sDBPath is not None:
+            self._conn = sqlite3.connect(
+                sDBPath, timeout=60, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS features ("
+                    "key TEXT PRIMARY KEY, "
+                    "value BLOB NOT NULL)")
+
+    def get_key(self, sObjectPath, sAlgorithm, dicParameters={}):
+        """ returns the cache key of the feature of an object
+
+        Args:
+            sObjectPath (str): path to the object
+            sAlgorithm (str): name of the algorithm computing the feature
+            dicParameters (:obj:): parameters of the algorithm influencing the feature
+
+        Returns:
+            str: key of the feature
+        """
+        sPath = os.path.expanduser(sObjectPath)
+        if self.bUseChecksum:
+            sIdentity = "sha1:" + self.__get_checksum(sPath)
+        else:
+            sIdentity = "path:" + sPath
+        return json.dumps([sIdentity, sAlgorithm, canonical_value(dicParameters)], sort_keys=True)
+
+    def __get_checksum(self, sPath):
+        """ returns the SHA1 of a file, memoized per path, modification time and size """
+        oStat = os.stat(sPath)
+        tpVersion = (oStat.st_mtime_ns, oStat.st_size)
+        with self._lock:
+            tpChecksum = self._dicChecksums.get(sPath)
+            if tpChecksum is not None and tpChecksum[0] == tpVersion:
+                self._dicChecksums.move_to_end(sPath)
+                return tpChecksum[1]
+        oSha1 = hashlib.sha1()
+        with open(sPath, "rb") as f:
+            for bChunk in iter(lambda: f.read(1 << 20), b""):
+                oSha1.update(bChunk)
+        sChecksum = oSha1.hexdigest()
+        with self._lock:
+            self._dicChecksums[sPath] = (tpVersion, sChecksum)
+            self._dicChecksums.move_to_end(sPath)
+            while len(self._dicChecksums) > self.lMaxEntries:
+                self._dicChecksums.popitem(last=False)
+        return sChecksum
+
+    def get(self, sObjectPath, sAlgorithm, dicParameters={}):
+        """ returns a cached feature or None if it is not cached """
+        return self.__lookup(self.get_key(sObjectPath, sAlgorithm, dicParameters))
+
+    def put(self, sObjectPath, sAlgorithm, oFeature, dicParameters={}):
+        """ stores a feature in the cache """
+        self.__store(self.get_key(
+            sObjectPath, sAlgorithm, dicParameters), oFeature)
+
+    def get_or_compute(self, sObjectPath, sAlgorithm, fnCompute, dicParameters={}):
+        """ returns the cached feature of an object or computes and caches it
+
+        Args:
+            sObjectPath (str): path to the object
+            sAlgorithm (str): name of the algorithm computing the feature
+            fnCompute (function): function computing the feature given sObjectPath
+            dicParameters (:obj:): parameters of the algorithm influencing the feature
+
+        Returns:
+            the feature of the object
+        """
+        sKey = self.get_key(sObjectPath, sAlgorithm, dicParameters)
+        oFeature = self.__lookup(sKey)
+        if oFeature is None:
+            oFeature = fnCompute(sObjectPath)
+            self.__store(sKey, oFeature)
+        return oFeature
+
+    def commit(self):
+        """ commits new features to the persistent tier """
+        with self._lock:
+            if self._conn is not None and self._dicPending:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO features (key, value) VALUES (?, ?)",
+                        ((sKey, pickle.dumps(oFeature, pickle.HIGHEST_PROTOCOL))
+                         for sKey, oFeature in self._dicPending.items()))
+                self._dicPending.clear()
+
+    def clear(self):
+        """ removes all features from both tiers and resets the statistics """
+        with self._lock:
+            self._dicMemory.clear()
+            self._dicPending.clear()
+            self._dicChecksums.clear()
+            for sKey in self._dicStatistics:
+                self._dicStatistics[sKey] = 0
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM features")
+
+    def get_statistics(self):
+        """ returns hit and miss counters of the cache """
+        with self._lock:
+            dicStatistics = dict(self._dicStatistics)
+            dicStatistics["memory_entries"] = len(self._dicMemory)
+            return dicStatistics
+
+    def __lookup(self, sKey):
+        """ looks up a key in memory first, then in the persistent tier """
+        with self._lock:
+            if sKey in self._dicMemory:
+                self._dicMemory.move_to_end(sKey)
+                self._dicStatistics["memory_hits"] += 1
+                return self._dicMemory[sKey]
+            if sKey in self._dicPending:
+                self.__remember(sKey, self._dicPending[sKey])
+                self._dicStatistics["persistent_hits"] += 1
+                return self._dicPending[sKey]
+            if self._conn is not None:
+                tpRow = self._conn.execute(
+                    "SELECT value FROM features WHERE key = ?", (sKey,)).fetchone()
+                if tpRow is not None:
+                    oFeature = pickle.loads(tpRow[0])
+                    self.__remember(sKey, oFeature)
+                    self._dicStatistics["persistent_hits"] += 1
+                    return oFeature
+            self._dicStatistics["misses"] += 1
+            return None
+
+    def __store(self, sKey, oFeature):
+        """ stores a feature in memory and in the persistent tier """
+        with self._lock:
+            self.__remember(sKey, oFeature)
+            if self._conn is not None:
+                self._dicPending[sKey] = oFeature
+                if len(self._dicPending) >= self.lCommitEvery:
+                    self.commit()
+
+    def __remember(self, sKey, oFeature):
+        """ puts a feature into the in-memory LRU tier """
+        self._dicMemory[sKey] = oFeature
+        self._dicMemory.move_to_end(sKey)
+        while len(self._dicMemory) > self.lMaxEntries:
+            self._dicMemory.popitem(last=False)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""
+This module defines an index over binary hashes for radius and k nearest neighbour
+queries in Hamming space, e.g. to benchmark 1:N identification challenges
+"""
+
+from itertools import combinations
+import numpy as np
+
+from twizzle.deviation_presets import popcount
+from twizzle.hashalgos_preset import pack_hash, unpack_hash
+
+
+class HammingIndex(object):
+    """Multi-index hashing over binary hashes
+
+    Note:
+        Following Norouzi et al., "Fast Search in Hamming Space with Multi-Index Hashing", 2012.
+        The bits of every hash are split into lNrOfSubstrings substrings, each indexed
+        by a sorted table. Two hashes within a distance of r bits have at least one
+        substring within floor(r / lNrOfSubstrings) bits, so a radius query only looks
+        up the substrings close to the substrings of the query and verifies the
+        candidates with their exact distance. Queries that would look up or verify
+        more than 1 / LINEAR_SCAN_FRACTION of the hashes fall back to a linear scan,
+        as a scan over all packed hashes is faster than gathering that many candidates.
+        All distances are numbers of differing bits.
+    """
+
+    # share of the hashes (as 1 / LINEAR_SCAN_FRACTION) above which verifying
+    # candidates is slower than a linear scan over all hashes
+    LINEAR_SCAN_FRACTION = 32
+
+    def __init__(self, aHashes, lNrOfSubstrings=None, aIds=None):
+        """Constructor of the HammingIndex class
+
+        Args:
+            aHashes (numpy.ndarray): (N, lBits) boolean matrix of hashes
+            lNrOfSubstrings (int): number of substrings, by default one per 16 bits
+            aIds (list): identifiers returned for the hashes (e.g. paths), by default the row numbers
+        """
+        aHashes = np.asarray(aHashes, dtype=bool)
+        if aHashes.ndim != 2:
+            raise Exception("Hashes have to be given as matrix with one hash per row")
+        if aIds is not None and len(aIds) != aHashes.shape[0]:
+            raise Exception("Hashes and ids have to have the same amount of entries.")
+        self.lBits = aHashes.shape[1]
+        if lNrOfSubstrings is None:
+            lNrOfSubstrings = max(1, self.lBits // 16)
+        if not 0 < lNrOfSubstrings <= self.lBits:
+            raise Exception("lNrOfSubstrings has to be between 1 and the number of bits")
+        if -(-self.lBits // lNrOfSubstrings) > 64:
+            raise Exception("Substrings must not be longer than 64 bits")
+        self.aIds = aIds
+        self.aPackedHashes = pack_hash(aHashes)
+        self.dicMasks = {}
+        # bounds of the substrings, all of about the same length
+        self.aBounds = np.linspace(0, self.lBits, lNrOfSubstrings + 1).astype(int)
+        self.aSortedKeys = []
+        self.aOrders = []
+        for lStart, lEnd in zip(self.aBounds[:-1], self.aBounds[1:]):
+            aKeys = self.__get_keys(aHashes[:, lStart:lEnd])
+            aOrder = np.argsort(aKeys, kind="stable")
+            self.aOrders.append(aOrder)
+            self.aSortedKeys.append(aKeys[aOrder])
+
+    def __len__(self):
+        return self.aPackedHashes.shape[0]
+
+    @staticmethod
+    def __get_keys(aBits):
+        """ integer keys of substrings given as boolean matrix """
+        aWeights = np.left_shift(np.uint64(1), np.arange(
+            aBits.shape[1], dtype=np.uint64))
+        return aBits.astype(np.uint64) @ aWeights
+
+    def __get_masks(self, lLength, lRadius):
+        """ all keys having at most lRadius of lLength bits set, computed once per length and radius """
+        if (lLength, lRadius) not in self.dicMasks:
+            aMasks = [0]
+            for lFlips in range(1, lRadius + 1):
+                for tpBits in combinations(range(lLength), lFlips):
+                    aMasks.append(sum(1 << lBit for lBit in tpBits))
+            self.dicMasks[(lLength, lRadius)] = np.array(aMasks, dtype=np.uint64)
+        return self.dicMasks[(lLength, lRadius)]
+
+    @staticmethod
+    def __count_masks(lLength, lRadius):
+        """ number of keys having at most lRadius of lLength bits set """
+        lCount, lTerm = 0, 1
+        for lFlips in range(lRadius + 1):
+            lCount += lTerm
+            lTerm = lTerm * (lLength - lFlips) // (lFlips + 1)
+        return lCount
+
+    def get_distances(self, aQueryHash):
+        """ distances of a boolean query hash to all hashes of the index """
+        aPackedQuery = pack_hash(aQueryHash)
+        return popcount(np.bitwise_xor(self.aPackedHashes, aPackedQuery))
+
+    def __get_candidates(self, aQueryHash, lRadius):
+        """ rows that might be within lRadius bits of the query or None if a linear scan is cheaper
+
+        Note:
+            Rows matching several substrings are returned several times.
+        """
+        lMaxCandidates = len(self) // self.LINEAR_SCAN_FRACTION
+        lSubRadius = lRadius // len(self.aSortedKeys)
+        aLengths = (self.aBounds[1:] - self.aBounds[:-1]).tolist()
+        aLookups = [self.__count_masks(lLength, lSubRadius) for lLength in aLengths]
+        # lookups and candidates expected for uniformly distributed hashes, checked before any lookup
+        dExpected = sum(lLookups * len(self) / 2.0 ** lLength for lLookups, lLength in zip(aLookups, aLengths))
+        if sum(aLookups) > lMaxCandidates or dExpected > lMaxCandidates:
+            return None
+        aRanges = []
+        lCandidates = 0
+        for i, (lStart, lEnd) in enumerate(zip(self.aBounds[:-1], self.aBounds[1:])):
+            lKey = self.__get_keys(aQueryHash[np.newaxis, lStart:lEnd])[0]
+            aKeys = np.bitwise_xor(self.__get_masks(lEnd - lStart, lSubRadius), lKey)
+            aFrom = np.searchsorted(self.aSortedKeys[i], aKeys, side="left")
+            aTo = np.searchsorted(self.aSortedKeys[i], aKeys, side="right")
+            lCandidates += int((aTo - aFrom).sum())
+            if lCandidates > lMaxCandidates:
+                return None
+            aRanges.append((aFrom, aTo))
+        aCandidates = []
+        for i, (aFrom, aTo) in enumerate(aRanges):
+            aCounts = aTo - aFrom
+            # positions of all ranges concatenated: every range counts up from its start
+            aPositions = np.arange(aCounts.sum()) + np.repeat(aFrom - (np.cumsum(aCounts) - aCounts), aCounts)
+            aCandidates.append(self.aOrders[i][aPositions])
+        return np.concatenate(aCandidates)
+
+    def __get_candidate_distances(self, aQueryHash, aRows, lRadius):
+        """ distinct rows of the candidates within lRadius bits of the query and their distances """
+        aDistances = popcount(np.bitwise_xor(
+            self.aPackedHashes[aRows], pack_hash(aQueryHash)))
+        aFound = aDistances <= lRadius
+        aRows, aIndices = np.unique(aRows[aFound], return_index=True)
+        return aRows, aDistances[aFound][aIndices]
+
+    def __to_ids(self, aRows):
+        """ identifiers of rows of the index """
+        if self.aIds is None:
+            return aRows.tolist()
+        return [self.aIds[lRow] for lRow in aRows]
+
+    def search_radius(self, aQueryHash, lRadius):
+        """ finds all hashes within a distance of lRadius bits
+
+        Args:
+            aQueryHash (numpy.ndarray): boolean query hash
+            lRadius (int): maximal number of differing bits
+
+        Returns:
+            tuple: ids and distances of the hashes found, sorted by distance
+        """
+        aQueryHash = np.asarray(aQueryHash, dtype=bool).ravel()
+        if aQueryHash.size != self.lBits:
+            raise Exception("Query hash has to have %d bits" % self.lBits)
+        aRows = self.__get_candidates(aQueryHash, lRadius)
+        if aRows is None:
+            aDistances = self.get_distances(aQueryHash)
+            aRows = np.flatnonzero(aDistances <= lRadius)
+            aDistances = aDistances[aRows]
+        else:
+            aRows, aDistances = self.__get_candidate_distances(aQueryHash, aRows, lRadius)
+        aOrder = np.argsort(aDistances, kind="stable")
+        return self.__to_ids(aRows[aOrder]), aDistances[aOrder]
+
+    def search_knn(self, aQueryHash, lK):
+        """ finds the lK hashes closest to the query
+
+        Note:
+            The radius is increased until lK hashes are found within it, hashes
+            having the same distance are returned in the order they were indexed.
+
+        Args:
+            aQueryHash (numpy.ndarray): boolean query hash
+            lK (int): number of neighbours
+
+        Returns:
+            tuple: ids and distances of the neighbours, sorted by distance
+        """
+        aQueryHash = np.asarray(aQueryHash, dtype=bool).ravel()
+        if aQueryHash.size != self.lBits:
+            raise Exception("Query hash has to have %d bits" % self.lBits)
+        lK = min(lK, len(self))
+        lNrOfSubstrings = len(self.aSortedKeys)
+        # all radii having the same lookups are searched at once
+        lRadius = lNrOfSubstrings - 1
+        while True:
+            aRows = self.__get_candidates(aQueryHash, lRadius)
+            if aRows is None:
+                aDistances = self.get_distances(aQueryHash)
+                aRows = np.arange(len(self))
+                break
+            aRows, aDistances = self.__get_candidate_distances(aQueryHash, aRows, self.lBits)
+            if np.count_nonzero(aDistances <= lRadius) >= lK:
+                break
+            lNextRadius = lRadius + lNrOfSubstrings
+            if len(aRows) >= lK:
+                # lK candidates are within their lK-th distance, so the neighbours are as well
+                lKthDistance = np.partition(aDistances, lK - 1)[lK - 1]
+                lNextRadius = max(lNextRadius, (lKthDistance // lNrOfSubstrings + 1) * lNrOfSubstrings - 1)
+            lRadius = lNextRadius
+        if len(aRows) > lK > 0:
+            # the lK nearest rows without sorting all of them, ties in the order of the rows
+            lKthDistance = np.searchsorted(np.cumsum(np.bincount(aDistances)), lK)
+            aCloser = np.flatnonzero(aDistances < lKthDistance)
+            aTied = np.flatnonzero(aDistances == lKthDistance)[:lK - len(aCloser)]
+            aSelected = np.concatenate((aCloser, aTied))
+            aRows, aDistances = aRows[aSelected], aDistances[aSelected]
+        aOrder = np.lexsort((aRows, aDistances))[:lK]
+        return self.__to_ids(aRows[aOrder]), aDistances[aOrder]
+
+    def get_hash(self, lRow):
+        """ boolean hash of a row of the index """
+        return unpack_hash(self.aPackedHashes[lRow], self.lBits)
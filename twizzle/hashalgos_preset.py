@@ -3,19 +3,65 @@ This module defines common perceptual image hashing algorithms that can be used
 """
 
 import numpy
-import cv2
 
 
 def __resize_image_downscale(aInputImage, lImageWidth, lImageHeight):
     """resizing an image to a given size"""
+    import cv2
     return cv2.resize(aInputImage, (lImageWidth, lImageHeight), interpolation=cv2.INTER_AREA)
 
 
 def __convert_image_to_grayscale(aInputImage):
-    """converting an image to grayscale"""
+    """converting an image to grayscale, images having a single channel are returned as they are"""
+    if aInputImage.ndim == 2:
+        return aInputImage
+    import cv2
     return cv2.cvtColor(aInputImage, cv2.COLOR_BGR2GRAY)
 
 
+def __convert_images_to_grayscale(aInputImages):
+    """converting a list or a (N,H,W[,C]) stack of images to grayscale
+
+    Color images of a stack are converted in a single call, the result is a (N,H,W)
+    stack then. Lists are converted image by image.
+    """
+    if isinstance(aInputImages, numpy.ndarray) and (aInputImages.ndim == 3 or
+                                                    (aInputImages.ndim == 4 and aInputImages.shape[3] == 3)):
+        lNrOfImages = aInputImages.shape[0]
+        if aInputImages.ndim == 4 and lNrOfImages > 0:
+            import cv2
+            lHeight, lWidth = aInputImages.shape[1:3]
+            aInputImages = cv2.cvtColor(numpy.ascontiguousarray(aInputImages).reshape(
+                lNrOfImages * lHeight, lWidth, 3), cv2.COLOR_BGR2GRAY).reshape(lNrOfImages, lHeight, lWidth)
+        elif aInputImages.ndim == 4:
+            aInputImages = aInputImages[..., 0]
+        return aInputImages
+    return [__convert_image_to_grayscale(aInputImage) for aInputImage in aInputImages]
+
+
+def __resize_images_downscale(aInputImages, lImageWidth, lImageHeight):
+    """downscaling a list or a (N,H,W) stack of grayscale images to a (N, lImageHeight, lImageWidth) stack
+
+    Every image is downscaled straight into the resulting stack.
+    """
+    import cv2
+    aPixels = numpy.empty((len(aInputImages), lImageHeight, lImageWidth),
+                          dtype=aInputImages[0].dtype if len(aInputImages) else numpy.uint8)
+    for i, aInputImage in enumerate(aInputImages):
+        cv2.resize(aInputImage, (lImageWidth, lImageHeight),
+                   dst=aPixels[i], interpolation=cv2.INTER_AREA)
+    return aPixels
+
+
+def __resize_images_downscale_to_grayscale(aInputImages, lImageWidth, lImageHeight):
+    """converting a list or a (N,H,W[,C]) stack of images to a (N, lImageHeight, lImageWidth) stack
+    of downscaled grayscale images
+
+    Yields exactly the same pixels as converting and resizing every image on its own.
+    """
+    return __resize_images_downscale(__convert_images_to_grayscale(aInputImages), lImageWidth, lImageHeight)
+
+
 def average_hash(image, hash_size=8):
     """
     Average Hash computation
@@ -62,3 +108,409 @@ def dhash(image, hash_size=8):
     # compute differences between columns
     diff = pixels[:, 1:] > pixels[:, :-1]
     return diff.flatten()
+
+
+def average_hash_batch(images, hash_size=8):
+    """
+    Average Hash computation for many images at once
+
+    Takes a list of images or a (N,H,W[,C]) stack and returns a (N, hash_size*hash_size)
+    boolean matrix whose rows are bit-identical to `average_hash` of every image.
+    """
+    if hash_size < 0:
+        raise ValueError("Hash size must be positive")
+
+    pixels = __resize_images_downscale_to_grayscale(
+        images, hash_size, hash_size)
+    return __average_hash_from_pixels(pixels, hash_size)
+
+
+def dhash_batch(images, hash_size=8):
+    """
+    Difference Hash computation for many images at once
+
+    Takes a list of images or a (N,H,W[,C]) stack and returns a (N, hash_size*hash_size)
+    boolean matrix whose rows are bit-identical to `dhash` of every image.
+    """
+    if hash_size < 0:
+        raise ValueError("Hash size must be positive")
+
+    pixels = __resize_images_downscale_to_grayscale(
+        images, hash_size + 1, hash_size)
+    return __dhash_from_pixels(pixels, hash_size)
+
+
+def __average_hash_from_pixels(pixels, hash_size):
+    """average hash of a (N, hash_size, hash_size) stack of downscaled grayscale images"""
+    pixels = pixels.reshape(pixels.shape[0], hash_size * hash_size)
+    # the average of every image, computed like in average_hash
+    avg = pixels.mean(axis=1)
+    return pixels > avg[:, numpy.newaxis]
+
+
+def __dhash_from_pixels(pixels, hash_size):
+    """difference hash of a (N, hash_size, hash_size + 1) stack of downscaled grayscale images"""
+    # compute differences between columns
+    diff = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return diff.reshape(diff.shape[0], hash_size * hash_size)
+
+
+def __dct_matrix(lSize):
+    """orthonormal DCT-II matrix of size lSize x lSize"""
+    aRange = numpy.arange(lSize)
+    aMatrix = numpy.cos(numpy.pi * (2 * aRange[numpy.newaxis, :] + 1)
+                        * aRange[:, numpy.newaxis] / (2 * lSize)) * numpy.sqrt(2.0 / lSize)
+    aMatrix[0] /= numpy.sqrt(2.0)
+    return aMatrix
+
+
+def __phash_from_pixels(pixels, hash_size):
+    """pHash of a (N, h, w) stack of downscaled grayscale images"""
+    aDCT = __dct_matrix(pixels.shape[1])
+    # 2D DCT of every image as D * P * D^T
+    dct = aDCT @ pixels.astype(numpy.float64) @ aDCT.T
+    dctlowfreq = dct[:, :hash_size, :hash_size].reshape(
+        pixels.shape[0], hash_size * hash_size)
+    med = numpy.median(dctlowfreq, axis=1)
+    return dctlowfreq > med[:, numpy.newaxis]
+
+
+def __whash_from_pixels(pixels, hash_size):
+    """wHash of a (N, s, s) stack of downscaled grayscale images, s being hash_size times a power of two"""
+    ll = pixels.astype(numpy.float64) / 255
+    # approximation coefficients of the 2D haar wavelet, one level at a time
+    while ll.shape[1] > hash_size:
+        ll = (ll[:, 0::2, 0::2] + ll[:, 1::2, 0::2] +
+              ll[:, 0::2, 1::2] + ll[:, 1::2, 1::2]) / 2
+    ll = ll.reshape(pixels.shape[0], hash_size * hash_size)
+    med = numpy.median(ll, axis=1)
+    return ll > med[:, numpy.newaxis]
+
+
+def __block_mean_hash_from_pixels(pixels, hash_size, block_size, overlapping):
+    """block mean hash of a (N, s, s) stack of downscaled grayscale images, s being hash_size * block_size"""
+    lNrOfImages = pixels.shape[0]
+    if overlapping:
+        # means of half blocks, then blocks shifted by half a block
+        lHalf = block_size // 2
+        half = pixels.reshape(lNrOfImages, 2 * hash_size, lHalf,
+                              2 * hash_size, lHalf).mean(axis=(2, 4))
+        means = (half[:, :-1, :-1] + half[:, 1:, :-1] +
+                 half[:, :-1, 1:] + half[:, 1:, 1:]) / 4
+    else:
+        means = pixels.reshape(lNrOfImages, hash_size, block_size,
+                               hash_size, block_size).mean(axis=(2, 4))
+    means = means.reshape(lNrOfImages, -1)
+    med = numpy.median(means, axis=1)
+    return means > med[:, numpy.newaxis]
+
+
+def __check_whash_parameters(hash_size, image_scale):
+    """returns the image scale of wHash, raising if it is no power of two multiple of the hash size"""
+    if image_scale is None:
+        image_scale = hash_size * 8
+    lLevels = image_scale // hash_size if hash_size > 0 else 0
+    if lLevels < 1 or image_scale % hash_size or lLevels & (lLevels - 1):
+        raise ValueError(
+            "image_scale must be hash_size multiplied by a power of 2")
+    return image_scale
+
+
+def __check_block_mean_hash_parameters(block_size, overlapping):
+    """raises if the block size does not fit the block mode"""
+    if block_size < 1 or (overlapping and block_size % 2):
+        raise ValueError(
+            "block_size must be positive and even for overlapping blocks")
+
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """
+    Perceptual Hash computation.
+
+    following http://www.hackerfactor.com/blog/index.php?/archives/432-Looks-Like-It.html
+
+    The image is downscaled to hash_size * highfreq_factor pixels per side, the lowest
+    hash_size x hash_size frequencies of its 2D DCT are compared with their median.
+    """
+    if hash_size < 2:
+        raise ValueError("Hash size must be greater than or equal to 2")
+
+    img_size = hash_size * highfreq_factor
+    image = __convert_image_to_grayscale(image)
+    pixels = __resize_image_downscale(image, img_size, img_size)
+    return __phash_from_pixels(pixels[numpy.newaxis], hash_size)[0]
+
+
+def whash(image, hash_size=8, image_scale=None):
+    """
+    Wavelet Hash computation.
+
+    following https://fullstackml.com/wavelet-image-hash-in-python-3504fdd282b5
+
+    The image is downscaled to image_scale pixels per side (hash_size * 8 by default),
+    the haar approximation coefficients at hash_size x hash_size are compared with
+    their median. Removing the lowest haar frequency like the reference does would
+    not change any bit, as all coefficients are shifted by the same amount.
+    """
+    if hash_size < 2:
+        raise ValueError("Hash size must be greater than or equal to 2")
+    image_scale = __check_whash_parameters(hash_size, image_scale)
+
+    image = __convert_image_to_grayscale(image)
+    pixels = __resize_image_downscale(image, image_scale, image_scale)
+    return __whash_from_pixels(pixels[numpy.newaxis], hash_size)[0]
+
+
+def block_mean_hash(image, hash_size=16, block_size=16, overlapping=False):
+    """
+    Block Mean Hash computation.
+
+    following Yang et al., "Block Mean Value Based Image Perceptual Hashing", 2006
+
+    The image is downscaled to hash_size * block_size pixels per side and split into
+    hash_size x hash_size blocks, the mean of every block is compared with the median
+    of all means. Overlapping blocks are shifted by half a block and yield
+    (2 * hash_size - 1)^2 bits.
+    """
+    if hash_size < 1:
+        raise ValueError("Hash size must be positive")
+    __check_block_mean_hash_parameters(block_size, overlapping)
+
+    img_size = hash_size * block_size
+    image = __convert_image_to_grayscale(image)
+    pixels = __resize_image_downscale(image, img_size, img_size)
+    return __block_mean_hash_from_pixels(pixels[numpy.newaxis], hash_size, block_size, overlapping)[0]
+
+
+def phash_batch(images, hash_size=8, highfreq_factor=4):
+    """
+    Perceptual Hash computation for many images at once
+
+    Takes a list of images or a (N,H,W[,C]) stack and returns a (N, hash_size*hash_size)
+    boolean matrix whose rows are bit-identical to `phash` of every image.
+    """
+    if hash_size < 2:
+        raise ValueError("Hash size must be greater than or equal to 2")
+
+    img_size = hash_size * highfreq_factor
+    pixels = __resize_images_downscale_to_grayscale(images, img_size, img_size)
+    return __phash_from_pixels(pixels, hash_size)
+
+
+def whash_batch(images, hash_size=8, image_scale=None):
+    """
+    Wavelet Hash computation for many images at once
+
+    Takes a list of images or a (N,H,W[,C]) stack and returns a (N, hash_size*hash_size)
+    boolean matrix whose rows are bit-identical to `whash` of every image.
+    """
+    if hash_size < 2:
+        raise ValueError("Hash size must be greater than or equal to 2")
+    image_scale = __check_whash_parameters(hash_size, image_scale)
+
+    pixels = __resize_images_downscale_to_grayscale(
+        images, image_scale, image_scale)
+    return __whash_from_pixels(pixels, hash_size)
+
+
+def block_mean_hash_batch(images, hash_size=16, block_size=16, overlapping=False):
+    """
+    Block Mean Hash computation for many images at once
+
+    Takes a list of images or a (N,H,W[,C]) stack and returns a boolean matrix whose
+    rows are bit-identical to `block_mean_hash` of every image.
+    """
+    if hash_size < 1:
+        raise ValueError("Hash size must be positive")
+    __check_block_mean_hash_parameters(block_size, overlapping)
+
+    img_size = hash_size * block_size
+    pixels = __resize_images_downscale_to_grayscale(images, img_size, img_size)
+    return __block_mean_hash_from_pixels(pixels, hash_size, block_size, overlapping)
+
+
+# size (width, height) of the grayscale image the hash functions downscale to,
+# given the parameters of the hash function
+INPUT_SIZES = {
+    "average_hash": lambda hash_size=8: (hash_size, hash_size),
+    "dhash": lambda hash_size=8: (hash_size + 1, hash_size),
+    "average_hash_batch": lambda hash_size=8: (hash_size, hash_size),
+    "dhash_batch": lambda hash_size=8: (hash_size + 1, hash_size),
+    "phash": lambda hash_size=8, highfreq_factor=4: (hash_size * highfreq_factor,) * 2,
+    "phash_batch": lambda hash_size=8, highfreq_factor=4: (hash_size * highfreq_factor,) * 2,
+    "whash": lambda hash_size=8, image_scale=None: (image_scale or hash_size * 8,) * 2,
+    "whash_batch": lambda hash_size=8, image_scale=None: (image_scale or hash_size * 8,) * 2,
+    "block_mean_hash": lambda hash_size=16, block_size=16, overlapping=False: (hash_size * block_size,) * 2,
+    "block_mean_hash_batch": lambda hash_size=16, block_size=16, overlapping=False: (hash_size * block_size,) * 2,
+}
+
+
+def get_input_size(fnHash, **dicHashParameters):
+    """returns the size (width, height) a hash function downscales its input to
+
+    Args:
+        fnHash (function): hash function of this module, e.g. `dhash`
+        dicHashParameters: parameters the hash function is called with
+
+    Returns:
+        tuple: width and height
+    """
+    sName = getattr(fnHash, "__name__", fnHash)
+    if sName not in INPUT_SIZES:
+        raise Exception("No input size declared for hash function %s" % sName)
+    return INPUT_SIZES[sName](**dicHashParameters)
+
+
+def load_image_for_hash(sPathToImage, fnHash, **dicHashParameters):
+    """load an image using the cheapest decode that is still large enough for a hash function
+
+    Note:
+        JPEG images are decoded to grayscale at the largest reduction of OpenCV that is
+        still four times larger than the input size of the hash, see
+        `utils.load_image_reduced`. Other images are decoded at full resolution. Hashes
+        of reduced images differ from hashes of fully decoded images: on JPEG versions
+        of the example images in `_img` dhash differs in up to 5 of 64 bits at hash
+        size 8 and in up to 13 of 256 bits at hash size 16.
+
+    Args:
+        sPathToImage (str): path to the image
+        fnHash (function): hash function the image is loaded for, e.g. `dhash`
+        dicHashParameters: parameters the hash function is called with
+
+    Returns:
+        the decoded grayscale image or None if it could not be read
+    """
+    from twizzle.utils import load_image_reduced
+    lWidth, lHeight = get_input_size(fnHash, **dicHashParameters)
+    return load_image_reduced(sPathToImage, lWidth, lHeight, bGrayscale=True)
+
+
+def pack_hash(aHash):
+    """packs a boolean hash into 64 bit words
+
+    Note:
+        Bits are packed most significant bit first and the last word is padded with
+        zeros. A 2D array is treated as one hash per row and packed row by row.
+
+    Args:
+        aHash (numpy.ndarray): boolean hash or (N, lBits) matrix of hashes
+
+    Returns:
+        numpy.ndarray: uint64 array of shape (lWords,) or (N, lWords)
+    """
+    aHash = numpy.asarray(aHash, dtype=bool)
+    if aHash.ndim != 2:
+        aHash = aHash.reshape(-1)
+    aBytes = numpy.packbits(aHash, axis=-1)
+    lPadding = -aBytes.shape[-1] % 8
+    if lPadding:
+        aPadding = [(0, 0)] * (aBytes.ndim - 1) + [(0, lPadding)]
+        aBytes = numpy.pad(aBytes, aPadding)
+    return numpy.ascontiguousarray(aBytes).view(">u8").astype(numpy.uint64)
+
+
+def unpack_hash(aPackedHash, lBits):
+    """unpacks a hash packed by `pack_hash` into a boolean hash
+
+    Args:
+        aPackedHash (numpy.ndarray): uint64 array of shape (lWords,) or (N, lWords)
+        lBits (int): number of bits of the hash
+
+    Returns:
+        numpy.ndarray: boolean array of shape (lBits,) or (N, lBits)
+    """
+    aPackedHash = numpy.asarray(aPackedHash, dtype=numpy.uint64)
+    if lBits > aPackedHash.shape[-1] * 64:
+        raise Exception("Packed hash holds less than %d bits" % lBits)
+    aBytes = numpy.ascontiguousarray(aPackedHash.astype(">u8")).view(numpy.uint8)
+    return numpy.unpackbits(aBytes, axis=-1, count=lBits).astype(bool)
+
+
+# functions computing hashes of a (N, height, width) stack of grayscale images already
+# downscaled to the input size of the hash, given the parameters of the hash function
+HASHES_FROM_PIXELS = {
+    "average_hash": lambda pixels, hash_size=8: __average_hash_from_pixels(pixels, hash_size),
+    "dhash": lambda pixels, hash_size=8: __dhash_from_pixels(pixels, hash_size),
+    "phash": lambda pixels, hash_size=8, highfreq_factor=4: __phash_from_pixels(pixels, hash_size),
+    "whash": lambda pixels, hash_size=8, image_scale=None: __whash_from_pixels(pixels, hash_size),
+    "block_mean_hash": lambda pixels, hash_size=16, block_size=16, overlapping=False:
+        __block_mean_hash_from_pixels(pixels, hash_size, block_size, overlapping),
+}
+
+
+# the intermediate image of `multi_size_hash_batch` has this many pixels per pixel of
+# the largest input size, the error of downscaling it again shrinks with the factor
+MULTI_SIZE_INTERMEDIATE_SCALE = 8
+
+
+def __resize_images_to_intermediate(aInputImages, lImageWidth, lImageHeight):
+    """downscaling a list or a (N,H,W) stack of grayscale images to float32 images of at most the
+    given size, images already being smaller along an axis keep their size along it"""
+    import cv2
+    return [cv2.resize(aInputImage.astype(numpy.float32),
+                       (min(lImageWidth, aInputImage.shape[1]), min(lImageHeight, aInputImage.shape[0])),
+                       interpolation=cv2.INTER_AREA)
+            for aInputImage in aInputImages]
+
+
+def multi_size_hash_batch(images, fnHash, aHashSizes, **dicHashParameters):
+    """computes hashes of many images at several hash sizes from one full resolution resize
+
+    Note:
+        The images are converted to grayscale and downscaled from full resolution once,
+        to a float32 intermediate of MULTI_SIZE_INTERMEDIATE_SCALE times the largest input
+        size. The input size of every hash size is downscaled from the intermediate and
+        rounded like OpenCV rounds the pixels of `fnHash`. Area downscaling averages
+        the same pixels either way, but rounding differs where a pixel lies close to
+        the middle of two gray values, so hashes may differ from the ones of `fnHash`:
+        on the example images in `_img` for hash sizes 8, 16 and 32 dhash differs in up
+        to 1 of 64, 2 of 256 and 0 of 1024 bits. Compute every size with `fnHash` if the
+        hashes have to be identical.
+
+    Args:
+        images: list of images or a (N,H,W[,C]) stack
+        fnHash (function): hash function of this module, e.g. `dhash`
+        aHashSizes (list): hash sizes to compute
+        dicHashParameters: further parameters of the hash function
+
+    Returns:
+        dict: (N, bits) boolean matrix of hashes for every hash size
+    """
+    sName = getattr(fnHash, "__name__", fnHash)
+    if sName.endswith("_batch"):
+        sName = sName[:-len("_batch")]
+    if sName not in HASHES_FROM_PIXELS:
+        raise Exception("Hash function %s can not be computed from pixels" % sName)
+
+    aLevels = [(get_input_size(sName, hash_size=lHashSize, **dicHashParameters), lHashSize)
+               for lHashSize in sorted(set(aHashSizes))]
+    if not aLevels:
+        return {}
+    images = __convert_images_to_grayscale(images)
+    dtype = images[0].dtype if len(images) else numpy.uint8
+    lMaxWidth = max(lWidth for (lWidth, _), _ in aLevels)
+    lMaxHeight = max(lHeight for (_, lHeight), _ in aLevels)
+    aIntermediates = __resize_images_to_intermediate(images, lMaxWidth * MULTI_SIZE_INTERMEDIATE_SCALE,
+                                                     lMaxHeight * MULTI_SIZE_INTERMEDIATE_SCALE)
+    dicHashes = {}
+    for (lWidth, lHeight), lHashSize in aLevels:
+        pixels = __resize_images_downscale(aIntermediates, lWidth, lHeight)
+        if numpy.issubdtype(dtype, numpy.integer):
+            # round to the pixels OpenCV computes for integer images
+            pixels = numpy.rint(pixels).astype(dtype)
+        dicHashes[lHashSize] = HASHES_FROM_PIXELS[sName](
+            pixels, hash_size=lHashSize, **dicHashParameters)
+    return dicHashes
+
+
+def multi_size_hash(image, fnHash, aHashSizes, **dicHashParameters):
+    """computes hashes of an image at several hash sizes from one full resolution resize
+
+    See `multi_size_hash_batch`.
+
+    Returns:
+        dict: boolean hash for every hash size
+    """
+    dicHashes = multi_size_hash_batch(
+        [image], fnHash, aHashSizes, **dicHashParameters)
+    return {lHashSize: aHashes[0] for lHashSize, aHashes in dicHashes.items()}
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+This module computes confusion matrices and the metrics derived from them for many
+decision vectors against one vector of target decisions in a single vectorized pass
+"""
+
+import numpy as np
+
+# metrics derived from the confusion matrix, in the order they are stored in a test
+METRIC_KEYS = ("errorrate", "TP", "TN", "FP", "FN", "accuracy",
+               "recall", "precision", "F1_score", "FAR", "FRR")
+
+
+def compute_confusion_matrices(aDecisions, aTargetDecisions):
+    """ counts true/false positives/negatives of every row of a decision matrix
+
+    Args:
+        aDecisions (numpy.ndarray): (T, N) matrix of boolean decisions or a single vector of N decisions
+        aTargetDecisions (:obj:`list` of :obj:`bool`): N target decisions
+
+    Returns:
+        tuple: arrays of T counts each of TP, TN, FP and FN
+    """
+    aDecisions = np.atleast_2d(np.asarray(aDecisions, dtype=bool))
+    aTargetDecisions = np.asarray(aTargetDecisions, dtype=bool).ravel()
+    if aDecisions.shape[1] != aTargetDecisions.size:
+        raise Exception(
+            "Array of Decisions is not the same size as given set of objects. Aborting.")
+    lPositives = np.count_nonzero(aTargetDecisions)
+    lNegatives = aTargetDecisions.size - lPositives
+    aTP = np.count_nonzero(aDecisions[:, aTargetDecisions], axis=1)
+    aFP = np.count_nonzero(aDecisions, axis=1) - aTP
+    return aTP, lNegatives - aFP, aFP, lPositives - aTP
+
+
+def __divide(aNumerator, aDenominator):
+    """ element-wise division yielding 0 where the denominator is 0 """
+    aNumerator = np.asarray(aNumerator, dtype=np.float64)
+    aDenominator = np.asarray(aDenominator, dtype=np.float64)
+    aResult = np.zeros(np.broadcast(aNumerator, aDenominator).shape)
+    np.divide(aNumerator, aDenominator, out=aResult, where=aDenominator != 0)
+    return aResult
+
+
+def compute_metrics(aTP, aTN, aFP, aFN):
+    """ computes the metrics of a test from arrays of confusion matrix counts
+
+    Note:
+        Rates whose denominator is 0 (e.g. the precision of a test accepting no pair)
+        are 0. FRR is the share of pairs being the same that were rejected.
+
+    Returns:
+        :obj:: dictionary of arrays, one per key of METRIC_KEYS
+    """
+    aTP, aTN, aFP, aFN = (np.asarray(a) for a in (aTP, aTN, aFP, aFN))
+    aPrecision = __divide(aTP, aTP + aFP)
+    aRecall = __divide(aTP, aTP + aFN)
+    return {"errorrate": __divide(aFP + aFN, aTP + aTN + aFP + aFN),
+            "TP": aTP,
+            "TN": aTN,
+            "FP": aFP,
+            "FN": aFN,
+            "accuracy": __divide(aTP + aTN, aTP + aTN + aFP + aFN),
+            "recall": aRecall,
+            "precision": aPrecision,
+            "F1_score": __divide(2 * aPrecision * aRecall, aPrecision + aRecall),
+            "FAR": __divide(aFP, aFP + aTN),
+            "FRR": __divide(aFN, aFN + aTP)}
+
+
+def evaluate_decision_matrix(aDecisions, aTargetDecisions):
+    """ computes confusion matrices and metrics of many decision vectors at once
+
+    Args:
+        aDecisions (numpy.ndarray): (T, N) matrix of boolean decisions, one row per test
+        aTargetDecisions (:obj:`list` of :obj:`bool`): N target decisions
+
+    Returns:
+        :obj:: dictionary of arrays of T values, one per key of METRIC_KEYS
+    """
+    return compute_metrics(*compute_confusion_matrices(aDecisions, aTargetDecisions))
+
+
+def get_test_metrics(dicMetrics, i=0):
+    """ returns the metrics of row i of `compute_metrics` as dictionary of scalars """
+    return {sKey: dicMetrics[sKey][i] for sKey in METRIC_KEYS}
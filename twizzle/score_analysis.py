@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+This module computes ROC and DET curves, the area under the ROC curve, the equal error
+rate and error rates at fixed operating points from per-pair deviation scores
+
+Like `Twizzle.run_threshold_sweep`, a pair is decided to be the same if its score is
+smaller or equal than the threshold. Scores are sorted once, so the whole curve of a
+challenge with N pairs is computed in O(N log N) without building any test records.
+"""
+
+import numpy as np
+
+# coefficients of the rational approximations of the normal quantile function by
+# P. J. Acklam, relative error below 1.15e-9
+PROBIT_CENTRAL_NUMERATOR = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+                            1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+PROBIT_CENTRAL_DENOMINATOR = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+                              6.680131188771972e+01, -1.328068155288572e+01, 1.0)
+PROBIT_TAIL_NUMERATOR = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+                         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+PROBIT_TAIL_DENOMINATOR = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+                           3.754408661907416e+00, 1.0)
+# probabilities below this (or above 1 minus this) use the tail approximation
+PROBIT_TAIL = 0.02425
+
+
+def compute_roc(aScores, aTargetDecisions):
+    """ computes the error rates of every distinct threshold
+
+    Note:
+        The first operating point has the threshold -inf, rejecting every pair.
+        NaN scores are never decided to be the same.
+
+    Args:
+        aScores (:obj:`list` of :obj:`float`): deviation score of every pair
+        aTargetDecisions (:obj:`list` of :obj:`bool`): target decision of every pair
+
+    Returns:
+        :obj:: dictionary of arrays "thresholds", "FAR", "FRR" and "TPR", one entry per operating
+               point in increasing order of the threshold
+    """
+    aScores = np.asarray(aScores, dtype=np.float64).ravel()
+    aTargetDecisions = np.asarray(aTargetDecisions, dtype=bool).ravel()
+    if aScores.shape != aTargetDecisions.shape:
+        raise Exception(
+            "Array of Scores is not the same size as given set of objects. Aborting.")
+    lPositives = np.count_nonzero(aTargetDecisions)
+    lNegatives = aTargetDecisions.size - lPositives
+    if lPositives == 0 or lNegatives == 0:
+        raise Exception(
+            "Scores of pairs being the same and pairs being different are needed.")
+
+    aValid = ~np.isnan(aScores)
+    aOrder = np.argsort(aScores[aValid], kind="stable")
+    aSortedScores = aScores[aValid][aOrder]
+    aSortedTargets = aTargetDecisions[aValid][aOrder]
+
+    # accepted pairs at the last position of every distinct score
+    aLast = np.flatnonzero(np.append(
+        aSortedScores[1:] != aSortedScores[:-1], True)) if aSortedScores.size else np.empty(0, dtype=np.intp)
+    aTP = np.cumsum(aSortedTargets)[aLast]
+    aFP = (aLast + 1) - aTP
+
+    aThresholds = np.concatenate(([-np.inf], aSortedScores[aLast]))
+    aTP = np.concatenate(([0], aTP))
+    aFP = np.concatenate(([0], aFP))
+    aFRR = (lPositives - aTP) / lPositives
+    return {"thresholds": aThresholds, "FAR": aFP / lNegatives, "FRR": aFRR, "TPR": 1 - aFRR}
+
+
+def compute_auc(dicRoc):
+    """ area under the ROC curve (true positive rate over false acceptance rate) """
+    aFAR, aTPR = dicRoc["FAR"], dicRoc["TPR"]
+    # trapezoidal rule, the curve is extended to (1, 1)
+    aFAR = np.append(aFAR, 1.0)
+    aTPR = np.append(aTPR, 1.0)
+    return float(np.sum(np.diff(aFAR) * (aTPR[1:] + aTPR[:-1]) / 2))
+
+
+def compute_eer(dicRoc):
+    """ equal error rate, the rate at which FAR and FRR cross
+
+    Returns:
+        tuple: the equal error rate, interpolated linearly between the operating points
+               enclosing the crossing, and the first threshold having FAR >= FRR
+    """
+    aFAR, aFRR = dicRoc["FAR"], dicRoc["FRR"]
+    # FAR - FRR never decreases with the threshold
+    aDifference = aFAR - aFRR
+    i = int(np.searchsorted(aDifference, 0, side="left"))
+    if i == len(aDifference):
+        # pairs with NaN scores keep FRR above FAR
+        i -= 1
+    if i == 0 or aDifference[i] <= 0:
+        return float((aFAR[i] + aFRR[i]) / 2), float(dicRoc["thresholds"][i])
+    dWeight = -aDifference[i - 1] / (aDifference[i] - aDifference[i - 1])
+    dEER = aFAR[i - 1] + dWeight * (aFAR[i] - aFAR[i - 1])
+    return float(dEER), float(dicRoc["thresholds"][i])
+
+
+def get_far_at_frr(dicRoc, aFRRs):
+    """ lowest false acceptance rates reachable with false rejection rates not above the given ones
+
+    Args:
+        dicRoc (:obj:): curve as returned by `compute_roc`
+        aFRRs (:obj:`list` of :obj:`float`): maximal false rejection rates
+
+    Returns:
+        tuple: arrays of the false acceptance rates and of the thresholds reaching them,
+               NaN if a false rejection rate can not be reached
+    """
+    aFRRs = np.asarray(aFRRs, dtype=np.float64).ravel()
+    # FRR never increases with the threshold, the first point below the limit has the lowest FAR
+    aIndices = np.searchsorted(-dicRoc["FRR"], -aFRRs, side="left")
+    aReachable = aIndices < len(dicRoc["FRR"])
+    aIndices = np.minimum(aIndices, len(dicRoc["FRR"]) - 1)
+    aFAR = np.where(aReachable, dicRoc["FAR"][aIndices], np.nan)
+    aThresholds = np.where(
+        aReachable, dicRoc["thresholds"][aIndices], np.nan)
+    return aFAR, aThresholds
+
+
+def probit(aP):
+    """ normal quantile function of an array of probabilities in (0, 1)
+
+    Note:
+        Vectorized rational approximation by P. J. Acklam, the relative error is below 1.15e-9.
+
+    Args:
+        aP (numpy.ndarray): probabilities
+
+    Returns:
+        numpy.ndarray: normal deviates x having P(X <= x) = p
+    """
+    aP = np.asarray(aP, dtype=np.float64)
+    aX = np.empty_like(aP)
+    aCentral = (aP >= PROBIT_TAIL) & (aP <= 1 - PROBIT_TAIL)
+    aQ = aP[aCentral] - 0.5
+    aR = aQ * aQ
+    aX[aCentral] = np.polyval(PROBIT_CENTRAL_NUMERATOR, aR) * aQ / np.polyval(PROBIT_CENTRAL_DENOMINATOR, aR)
+    # both tails are computed from the smaller of p and 1 - p
+    aTail = ~aCentral
+    aLower = np.minimum(aP[aTail], 1 - aP[aTail])
+    aQ = np.sqrt(-2 * np.log(aLower))
+    aTailX = np.polyval(PROBIT_TAIL_NUMERATOR, aQ) / np.polyval(PROBIT_TAIL_DENOMINATOR, aQ)
+    aX[aTail] = np.where(aP[aTail] < 0.5, aTailX, -aTailX)
+    return aX
+
+
+def compute_det(dicRoc):
+    """ DET curve, FAR and FRR transformed to normal deviates
+
+    Note:
+        Rates of 0 and 1 are clipped to 1e-9 and 1 - 1e-9 respectively.
+
+    Returns:
+        :obj:: dictionary of arrays "thresholds", "FAR" and "FRR" on the normal deviate scale
+    """
+    return {"thresholds": dicRoc["thresholds"],
+            "FAR": probit(np.clip(dicRoc["FAR"], 1e-9, 1 - 1e-9)),
+            "FRR": probit(np.clip(dicRoc["FRR"], 1e-9, 1 - 1e-9))}
+
+
+def analyze_scores(aScores, aTargetDecisions, aFRRs=(0.001, 0.01, 0.1)):
+    """ computes the ROC curve and its summary in one pass
+
+    Args:
+        aScores (:obj:`list` of :obj:`float`): deviation score of every pair
+        aTargetDecisions (:obj:`list` of :obj:`bool`): target decision of every pair
+        aFRRs (:obj:`list` of :obj:`float`): false rejection rates the false acceptance rate is reported for
+
+    Returns:
+        :obj:: dictionary holding the curve "roc" (see `compute_roc`), "AUC", "EER", "EER_threshold"
+               and for every false rejection rate f the keys "FAR@FRR=f" and "threshold@FRR=f"
+    """
+    dicRoc = compute_roc(aScores, aTargetDecisions)
+    dEER, dEERThreshold = compute_eer(dicRoc)
+    dicAnalysis = {"roc": dicRoc, "AUC": compute_auc(dicRoc),
+                   "EER": dEER, "EER_threshold": dEERThreshold}
+    aFAR, aThresholds = get_far_at_frr(dicRoc, aFRRs)
+    for dFRR, dFAR, dThreshold in zip(aFRRs, aFAR, aThresholds):
+        dicAnalysis["FAR@FRR=%g" % dFRR] = float(dFAR)
+        dicAnalysis["threshold@FRR=%g" % dFRR] = float(dThreshold)
+    return dicAnalysis
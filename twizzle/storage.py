@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+
+"""
+This module defines the storage backends Twizzle can use to persist challenges and tests
+"""
+
+import pickle
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from threading import RLock
+
+import numpy as np
+from sqlitedict import SqliteDict
+
+from twizzle.compact_challenge import CHALLENGE_PAIR_KEYS, PATH_SEPARATOR, CompactChallenge
+
+DB_CHALLENGES_KEY = 'challenges'
+# key of the dictionary mapping challenge names to their versions
+DB_CHALLENGE_VERSIONS_KEY = 'challenge_versions'
+DB_TESTS_KEY = 'tests'
+# prefix of the keys mapping a test fingerprint to the positions of its tests
+DB_FINGERPRINT_KEY_PREFIX = 'fingerprint/'
+# prefix of the keys of per-pair scores and decisions
+DB_PAIR_DATA_KEY_PREFIX = 'pair_data/'
+
+STORAGE_SQLITEDICT = 'sqlitedict'
+STORAGE_SQLITE = 'sqlite'
+
+# key of a test object linking it to its per-pair data
+TEST_PAIR_DATA_KEY = "pair_data"
+# keys of a test object holding per-pair data until it is saved
+TEST_PAIR_SCORES_KEY = "pair_scores"
+TEST_PAIR_DECISIONS_KEY = "pair_decisions"
+
+
+def split_pair_data(dicTest):
+    """ separates the per-pair data from a test object
+
+    Returns:
+        tuple: the test object without per-pair arrays and a dictionary holding the
+               float32 "scores" and the uint8 "decisions" (None if not given), or None
+               if the test carries no per-pair data
+    """
+    if TEST_PAIR_SCORES_KEY not in dicTest and TEST_PAIR_DECISIONS_KEY not in dicTest:
+        return dicTest, None
+    dicTest = dict(dicTest)
+    aScores = dicTest.pop(TEST_PAIR_SCORES_KEY, None)
+    aDecisions = dicTest.pop(TEST_PAIR_DECISIONS_KEY, None)
+    return dicTest, {
+        "scores": None if aScores is None else np.asarray(aScores, dtype=np.float32),
+        "decisions": None if aDecisions is None else np.asarray(aDecisions, dtype=np.uint8)}
+
+
+class SqliteDictChallengeStore(object):
+    """Challenge store keeping all challenges as one pickled list in a SqliteDict
+
+    Note:
+        This is the original storage format of Twizzle. Every operation loads and
+        writes the whole list of challenges.
+    """
+
+    def __init__(self, oDB):
+        """Constructor of the SqliteDictChallengeStore class
+
+        Args:
+            oDB (:obj:`SqliteDict`): opened SqliteDict the challenges are stored in
+        """
+        self._db = oDB
+
+    def close(self):
+        """ does nothing, the SqliteDict is closed by the one who opened it """
+
+    def add_challenge(self, dicChallenge):
+        """ appends a challenge object to the list of challenges """
+        aChallenges = self._db.get(DB_CHALLENGES_KEY, [])
+        aChallenges.append(dicChallenge)
+        self._db[DB_CHALLENGES_KEY] = aChallenges
+        dicVersions = self._db.get(DB_CHALLENGE_VERSIONS_KEY, {})
+        dicVersions[dicChallenge["challenge"]] = uuid.uuid4().hex
+        self._db[DB_CHALLENGE_VERSIONS_KEY] = dicVersions
+        self._db.commit()
+
+    def has_challenge(self, sName):
+        """ returns True if a challenge with the given name exists """
+        return self.get_challenge(sName) is not None
+
+    def del_challenge(self, sName):
+        """ deletes a challenge by its name, returns False if it was not found """
+        aChallenges = self._db.get(DB_CHALLENGES_KEY, [])
+        aMatches = [ch for ch in aChallenges if ch["challenge"] == sName]
+        if len(aMatches) == 0:
+            return False
+        aChallenges.remove(aMatches[0])
+        self._db[DB_CHALLENGES_KEY] = aChallenges
+        dicVersions = self._db.get(DB_CHALLENGE_VERSIONS_KEY, {})
+        dicVersions.pop(sName, None)
+        self._db[DB_CHALLENGE_VERSIONS_KEY] = dicVersions
+        self._db.commit()
+        return True
+
+    def get_challenges(self):
+        """ returns a list of all challenge objects """
+        return self._db.get(DB_CHALLENGES_KEY, [])
+
+    def get_challenge(self, sName):
+        """ returns the challenge object with the given name or None """
+        aMatches = [ch for ch in self._db.get(DB_CHALLENGES_KEY, [])
+                    if ch["challenge"] == sName]
+        if len(aMatches) == 0:
+            return None
+        return aMatches[0]
+
+    def get_compact_challenge(self, sName):
+        """ returns the challenge with the given name as CompactChallenge or None """
+        dicChallenge = self.get_challenge(sName)
+        if dicChallenge is None:
+            return None
+        return CompactChallenge.from_challenge(dicChallenge)
+
+    def get_challenge_version(self, sName):
+        """ returns an id that changes whenever the challenge with the given name is replaced or None
+
+        Note:
+            Challenges saved before versions were introduced get a version when it is
+            requested the first time.
+        """
+        sVersion = self._db.get(DB_CHALLENGE_VERSIONS_KEY, {}).get(sName)
+        if sVersion is None and self.has_challenge(sName):
+            dicVersions = self._db.get(DB_CHALLENGE_VERSIONS_KEY, {})
+            sVersion = dicVersions.setdefault(sName, uuid.uuid4().hex)
+            self._db[DB_CHALLENGE_VERSIONS_KEY] = dicVersions
+            self._db.commit()
+        return sVersion
+
+    def clear_challenges(self):
+        """ removes all challenges """
+        self._db[DB_CHALLENGES_KEY] = []
+        self._db[DB_CHALLENGE_VERSIONS_KEY] = {}
+        self._db.commit()
+
+
+class SqliteDictTestStore(object):
+    """Test store keeping all tests as one pickled list in a SqliteDict
+
+    Note:
+        This is the original storage format of Twizzle. Every save loads and
+        writes the whole list of tests.
+    """
+
+    def __init__(self, oDB):
+        """Constructor of the SqliteDictTestStore class
+
+        Args:
+            oDB (:obj:`SqliteDict`): opened SqliteDict the tests are stored in
+        """
+        self._db = oDB
+
+    def close(self):
+        """ does nothing, the SqliteDict is closed by the one who opened it """
+
+    def save_tests(self, aTests, aFingerprints=None):
+        """ appends a batch of test objects and commits once
+
+        Args:
+            aTests (:obj:`list` of :obj:): test objects
+            aFingerprints (:obj:`list` of :obj:`str`): fingerprint of every test or None
+        """
+        aStoredTests = self._db.get(DB_TESTS_KEY, [])
+        lOffset = len(aStoredTests)
+        aNewTests = []
+        for dicTest in aTests:
+            dicTest, dicPairData = split_pair_data(dicTest)
+            if dicPairData is not None:
+                sKey = DB_PAIR_DATA_KEY_PREFIX + dicTest[TEST_PAIR_DATA_KEY]
+                # tests of a threshold sweep share their scores
+                if sKey not in self._db:
+                    self._db[sKey] = dicPairData
+            aNewTests.append(dicTest)
+        self._db[DB_TESTS_KEY] = aStoredTests + aNewTests
+        if aFingerprints is not None:
+            for i, sFingerprint in enumerate(aFingerprints):
+                if sFingerprint is None:
+                    continue
+                sKey = DB_FINGERPRINT_KEY_PREFIX + sFingerprint
+                self._db[sKey] = self._db.get(sKey, []) + [lOffset + i]
+        self._db.commit()
+
+    def get_tests(self):
+        """ returns a list of all test objects """
+        return self._db.get(DB_TESTS_KEY, [])
+
+    def has_fingerprint(self, sFingerprint):
+        """ returns True if a test with the given fingerprint was saved """
+        return (DB_FINGERPRINT_KEY_PREFIX + sFingerprint) in self._db
+
+    def get_tests_by_fingerprint(self, sFingerprint):
+        """ returns the tests saved with the given fingerprint """
+        aPositions = self._db.get(DB_FINGERPRINT_KEY_PREFIX + sFingerprint)
+        if not aPositions:
+            return []
+        aTests = self._db.get(DB_TESTS_KEY, [])
+        return [aTests[i] for i in aPositions]
+
+    def get_pair_data(self, sPairDataId):
+        """ returns the per-pair data saved under the given id or None """
+        return self._db.get(DB_PAIR_DATA_KEY_PREFIX + sPairDataId)
+
+    def get_pair_data_items(self):
+        """ returns (id, per-pair data) of all saved per-pair data """
+        return [(sKey[len(DB_PAIR_DATA_KEY_PREFIX):], self._db[sKey]) for sKey in self._db.keys()
+                if sKey.startswith(DB_PAIR_DATA_KEY_PREFIX)]
+
+    def clear_tests(self):
+        """ removes all tests and their per-pair data """
+        self._db[DB_TESTS_KEY] = []
+        for sKey in [k for k in self._db.keys() if k.startswith(DB_FINGERPRINT_KEY_PREFIX) or
+                     k.startswith(DB_PAIR_DATA_KEY_PREFIX)]:
+            del self._db[sKey]
+        self._db.commit()
+
+
+class _SqliteStore(object):
+    """Base class of the stores working on plain SQLite tables
+
+    Note:
+        Every write runs in a savepoint. Writes inside `transaction()` are only
+        committed at its end, also writes of other stores sharing the connection.
+    """
+
+    def __init__(self, sDBPath, oConnectionStore=None):
+        """Constructor of the _SqliteStore class
+
+        Args:
+            sDBPath (str): Path to the SQLite database.
+            oConnectionStore (:obj:`_SqliteStore`): store whose connection is used instead
+                                                    of opening a new one
+        """
+        if oConnectionStore is None:
+            self._lock = RLock()
+            self._conn = sqlite3.connect(
+                sDBPath, timeout=60, check_same_thread=False)
+            self._bOwnsConnection = True
+        else:
+            self._lock = oConnectionStore._lock
+            self._conn = oConnectionStore._conn
+            self._bOwnsConnection = False
+        with self.transaction():
+            self._create_tables()
+
+    def _create_tables(self):
+        """ creates the tables of the store if they do not exist yet """
+        raise NotImplementedError()
+
+    @contextmanager
+    def transaction(self):
+        """ runs the block in a savepoint: it is rolled back if it raises, otherwise committed,
+        unless it is nested into another transaction on the same connection """
+        with self._lock:
+            self._conn.execute("SAVEPOINT store")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK TO store")
+                self._conn.execute("RELEASE store")
+                raise
+            self._conn.execute("RELEASE store")
+
+    def close(self):
+        """ closes the connection if the store opened it """
+        with self._lock:
+            if self._bOwnsConnection:
+                self._conn.close()
+
+
+class SqliteChallengeStore(_SqliteStore):
+    """Challenge store using a challenges table keyed by name and a separate table of pairs
+
+    Note:
+        Lookups, inserts and deletes only touch the rows of the affected challenge.
+        The tables can live in the same SQLite file as a SqliteDict.
+        The pairs are stored as the arrays of a `CompactChallenge` in one row of the
+        challenge_arrays table. Challenges saved before, or whose paths can not be
+        stored in a path table, have one row per pair in the challenge_pairs table.
+    """
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS challenges ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL UNIQUE, "
+            "metadata BLOB NOT NULL, "
+            "decisions_as_array INTEGER NOT NULL DEFAULT 0)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS challenge_pairs ("
+            "challenge_id INTEGER NOT NULL, "
+            "position INTEGER NOT NULL, "
+            "original TEXT NOT NULL, "
+            "comparative TEXT NOT NULL, "
+            "target INTEGER NOT NULL, "
+            "PRIMARY KEY (challenge_id, position)) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS challenge_arrays ("
+            "challenge_id INTEGER PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "path_table BLOB NOT NULL, "
+            "path_offsets BLOB NOT NULL, "
+            "originals BLOB NOT NULL, "
+            "comparatives BLOB NOT NULL, "
+            "decisions BLOB NOT NULL)")
+
+    def add_challenge(self, dicChallenge):
+        """ inserts a challenge object and its pairs in a single transaction """
+        dicMetadata = {k: v for k, v in dicChallenge.items()
+                       if k not in CHALLENGE_PAIR_KEYS}
+        bDecisionsAsArray = isinstance(
+            dicChallenge["targetDecisions"], np.ndarray)
+        # paths containing the separator of the path table are stored as pair rows
+        oCompactChallenge = None
+        if not any(PATH_SEPARATOR in sPath for aObjects in (dicChallenge["originalObjects"],
+                                                           dicChallenge["comparativeObjects"])
+                   for sPath in aObjects):
+            oCompactChallenge = CompactChallenge.from_challenge(dicChallenge)
+        with self.transaction():
+            oCursor = self._conn.execute(
+                "INSERT INTO challenges (name, metadata, decisions_as_array) VALUES (?, ?, ?)",
+                (dicChallenge["challenge"], pickle.dumps(dicMetadata, pickle.HIGHEST_PROTOCOL),
+                 int(bDecisionsAsArray)))
+            lChallengeId = oCursor.lastrowid
+            if oCompactChallenge is not None:
+                self._conn.execute(
+                    "INSERT INTO challenge_arrays (challenge_id, size, path_table, path_offsets, "
+                    "originals, comparatives, decisions) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (lChallengeId, len(oCompactChallenge), oCompactChallenge.aPathTable.tobytes(),
+                     oCompactChallenge.aPathOffsets.tobytes(), oCompactChallenge.aOriginalIndices.tobytes(),
+                     oCompactChallenge.aComparativeIndices.tobytes(), oCompactChallenge.aPackedDecisions.tobytes()))
+                return
+            self._conn.executemany(
+                "INSERT INTO challenge_pairs (challenge_id, position, original, comparative, target) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((lChallengeId, i, sOriginal, sComparative, int(bool(bTarget)))
+                 for i, (sOriginal, sComparative, bTarget) in enumerate(zip(
+                     dicChallenge["originalObjects"], dicChallenge["comparativeObjects"],
+                     dicChallenge["targetDecisions"]))))
+
+    def has_challenge(self, sName):
+        """ returns True if a challenge with the given name exists """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM challenges WHERE name = ?", (sName,)).fetchone() is not None
+
+    def del_challenge(self, sName):
+        """ deletes a challenge by its name, returns False if it was not found """
+        with self.transaction():
+            tpRow = self._conn.execute(
+                "SELECT id FROM challenges WHERE name = ?", (sName,)).fetchone()
+            if tpRow is None:
+                return False
+            self._conn.execute(
+                "DELETE FROM challenge_pairs WHERE challenge_id = ?", tpRow)
+            self._conn.execute(
+                "DELETE FROM challenge_arrays WHERE challenge_id = ?", tpRow)
+            self._conn.execute("DELETE FROM challenges WHERE id = ?", tpRow)
+            return True
+
+    def get_challenges(self):
+        """ returns a list of all challenge objects """
+        with self._lock:
+            aRows = self._conn.execute(
+                "SELECT id, name, metadata, decisions_as_array FROM challenges ORDER BY id").fetchall()
+            return [self.__build_challenge(*tpRow) for tpRow in aRows]
+
+    def get_challenge(self, sName):
+        """ returns the challenge object with the given name or None """
+        with self._lock:
+            tpRow = self._conn.execute(
+                "SELECT id, name, metadata, decisions_as_array FROM challenges WHERE name = ?",
+                (sName,)).fetchone()
+            if tpRow is None:
+                return None
+            return self.__build_challenge(*tpRow)
+
+    def get_compact_challenge(self, sName):
+        """ returns the challenge with the given name as CompactChallenge or None """
+        with self._lock:
+            tpRow = self._conn.execute(
+                "SELECT id, name, metadata, decisions_as_array FROM challenges WHERE name = ?",
+                (sName,)).fetchone()
+            if tpRow is None:
+                return None
+            oCompactChallenge = self.__load_compact_challenge(*tpRow)
+            if oCompactChallenge is None:
+                oCompactChallenge = CompactChallenge.from_challenge(
+                    self.__build_challenge(*tpRow))
+            return oCompactChallenge
+
+    def get_challenge_version(self, sName):
+        """ returns an id that changes whenever the challenge with the given name is replaced or None
+
+        Note:
+            The version is the id of the row of the challenge, ids are never reused.
+        """
+        with self._lock:
+            tpRow = self._conn.execute(
+                "SELECT id FROM challenges WHERE name = ?", (sName,)).fetchone()
+            return None if tpRow is None else str(tpRow[0])
+
+    def clear_challenges(self):
+        """ removes all challenges """
+        with self.transaction():
+            self._conn.execute("DELETE FROM challenge_pairs")
+            self._conn.execute("DELETE FROM challenge_arrays")
+            self._conn.execute("DELETE FROM challenges")
+
+    def __load_compact_challenge(self, lChallengeId, sName, bMetadata, bDecisionsAsArray):
+        """ loads the arrays of a challenge or returns None if it is stored as pair rows """
+        tpArrays = self._conn.execute(
+            "SELECT size, path_table, path_offsets, originals, comparatives, decisions "
+            "FROM challenge_arrays WHERE challenge_id = ?", (lChallengeId,)).fetchone()
+        if tpArrays is None:
+            return None
+        lSize, bPathTable, bPathOffsets, bOriginals, bComparatives, bDecisions = tpArrays
+        return CompactChallenge(sName, np.frombuffer(bPathTable, dtype=np.uint8),
+                                np.frombuffer(bPathOffsets, dtype=np.int64),
+                                np.frombuffer(bOriginals, dtype=np.int32),
+                                np.frombuffer(bComparatives, dtype=np.int32),
+                                np.frombuffer(bDecisions, dtype=np.uint8), lSize,
+                                pickle.loads(bMetadata), bool(bDecisionsAsArray))
+
+    def __build_challenge(self, lChallengeId, sName, bMetadata, bDecisionsAsArray):
+        """ assembles a challenge object from its table rows """
+        oCompactChallenge = self.__load_compact_challenge(
+            lChallengeId, sName, bMetadata, bDecisionsAsArray)
+        if oCompactChallenge is not None:
+            return oCompactChallenge.to_challenge()
+        aPairs = self._conn.execute(
+            "SELECT original, comparative, target FROM challenge_pairs "
+            "WHERE challenge_id = ? ORDER BY position", (lChallengeId,)).fetchall()
+        aTargetDecisions = [bool(tpPair[2]) for tpPair in aPairs]
+        if bDecisionsAsArray:
+            aTargetDecisions = np.array(aTargetDecisions, dtype=bool)
+        dicChallenge = pickle.loads(bMetadata)
+        dicChallenge["challenge"] = sName
+        dicChallenge["originalObjects"] = [tpPair[0] for tpPair in aPairs]
+        dicChallenge["comparativeObjects"] = [tpPair[1] for tpPair in aPairs]
+        dicChallenge["targetDecisions"] = aTargetDecisions
+        return dicChallenge
+
+
+class SqliteTestStore(_SqliteStore):
+    """Append-only test store writing every test as its own row
+
+    Note:
+        Saving a test is a single insert, independent of the number of tests
+        stored before.
+    """
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tests ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "data BLOB NOT NULL, "
+            "fingerprint TEXT)")
+        # tables created before fingerprints were introduced
+        aColumns = [tpRow[1] for tpRow in self._conn.execute(
+            "PRAGMA table_info(tests)")]
+        if "fingerprint" not in aColumns:
+            self._conn.execute("ALTER TABLE tests ADD COLUMN fingerprint TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tests_fingerprint ON tests (fingerprint)")
+        # per-pair scores (float32) and decisions (uint8) as raw bytes
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_data ("
+            "id TEXT PRIMARY KEY, "
+            "scores BLOB, "
+            "decisions BLOB)")
+
+    def save_tests(self, aTests, aFingerprints=None):
+        """ inserts a batch of test objects and commits once
+
+        Args:
+            aTests (:obj:`list` of :obj:): test objects
+            aFingerprints (:obj:`list` of :obj:`str`): fingerprint of every test or None
+        """
+        aTests = list(aTests)
+        if aFingerprints is None:
+            aFingerprints = [None] * len(aTests)
+        aPairData = []
+        for i, dicTest in enumerate(aTests):
+            aTests[i], dicPairData = split_pair_data(dicTest)
+            if dicPairData is not None:
+                aPairData.append((aTests[i][TEST_PAIR_DATA_KEY], dicPairData))
+        with self.transaction():
+            # tests of a threshold sweep share their scores
+            self.__save_pair_data(aPairData)
+            self._conn.executemany(
+                "INSERT INTO tests (data, fingerprint) VALUES (?, ?)",
+                ((pickle.dumps(dicTest, pickle.HIGHEST_PROTOCOL), sFingerprint)
+                 for dicTest, sFingerprint in zip(aTests, aFingerprints)))
+
+    def has_fingerprint(self, sFingerprint):
+        """ returns True if a test with the given fingerprint was saved """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM tests WHERE fingerprint = ?", (sFingerprint,)).fetchone() is not None
+
+    def get_tests_by_fingerprint(self, sFingerprint):
+        """ returns the tests saved with the given fingerprint """
+        with self._lock:
+            return [pickle.loads(tpRow[0]) for tpRow in self._conn.execute(
+                "SELECT data FROM tests WHERE fingerprint = ? ORDER BY id", (sFingerprint,))]
+
+    def get_tests(self):
+        """ returns a list of all test objects in the order they were saved """
+        with self._lock:
+            return [pickle.loads(tpRow[0]) for tpRow in
+                    self._conn.execute("SELECT data FROM tests ORDER BY id")]
+
+    def get_pair_data(self, sPairDataId):
+        """ returns the per-pair data saved under the given id or None """
+        with self._lock:
+            tpRow = self._conn.execute(
+                "SELECT scores, decisions FROM pair_data WHERE id = ?", (sPairDataId,)).fetchone()
+        if tpRow is None:
+            return None
+        return {"scores": None if tpRow[0] is None else np.frombuffer(tpRow[0], dtype=np.float32),
+                "decisions": None if tpRow[1] is None else np.frombuffer(tpRow[1], dtype=np.uint8)}
+
+    def save_pair_data_items(self, aPairData):
+        """ saves (id, per-pair data) tuples, ids saved before are skipped """
+        with self.transaction():
+            self.__save_pair_data(aPairData)
+
+    def __save_pair_data(self, aPairData):
+        """ inserts per-pair data inside the running transaction """
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO pair_data (id, scores, decisions) VALUES (?, ?, ?)",
+            ((sId, None if dicPairData["scores"] is None else dicPairData["scores"].tobytes(),
+              None if dicPairData["decisions"] is None else dicPairData["decisions"].tobytes())
+             for sId, dicPairData in aPairData))
+
+    def clear_tests(self):
+        """ removes all tests and their per-pair data """
+        with self.transaction():
+            self._conn.execute("DELETE FROM tests")
+            self._conn.execute("DELETE FROM pair_data")
+
+
+def create_stores(sStorage, sDBPath, oDB):
+    """ creates the challenge and the test store for the given storage name
+
+    Args:
+        sStorage (str): either STORAGE_SQLITEDICT or STORAGE_SQLITE
+        sDBPath (str): Path to the SQLite database.
+        oDB (:obj:`SqliteDict`): opened SqliteDict on the same database
+
+    Returns:
+        tuple: the challenge store and the test store
+    """
+    if sStorage == STORAGE_SQLITEDICT:
+        return SqliteDictChallengeStore(oDB), SqliteDictTestStore(oDB)
+    if sStorage == STORAGE_SQLITE:
+        return SqliteChallengeStore(sDBPath), SqliteTestStore(sDBPath)
+    raise Exception("Unknown storage %s. Use '%s' or '%s'." %
+                    (sStorage, STORAGE_SQLITEDICT, STORAGE_SQLITE))
+
+
+def migrate_sqlitedict_to_sqlite(sSourceDBPath, sTargetDBPath=None):
+    """ copies all challenges and tests of a SqliteDict database into the relational tables
+
+    Note:
+        Tests keep their fingerprints and per-pair data.
+        The source database is left untouched. If no target is given the relational
+        tables are created inside the source database, so it can be opened with
+        `Twizzle(sDBPath, sStorage="sqlite")` afterwards.
+        Everything is copied in a single transaction, so an interrupted or failed
+        migration leaves the target as it was and can simply be run again.
+
+    Args:
+        sSourceDBPath (str): Path to the SQLite database written with the SqliteDict storage
+        sTargetDBPath (str): Path to the SQLite database that should get the relational tables
+
+    Returns:
+        int: number of challenges migrated
+    """
+    if sTargetDBPath is None:
+        sTargetDBPath = sSourceDBPath
+    oSourceDB = SqliteDict(sSourceDBPath)
+    oTargetStore = None
+    try:
+        oTargetStore = SqliteChallengeStore(sTargetDBPath)
+        oTargetTestStore = SqliteTestStore(sTargetDBPath, oTargetStore)
+        with oTargetStore.transaction():
+            lMigrated = 0
+            for dicChallenge in oSourceDB.get(DB_CHALLENGES_KEY, []):
+                if oTargetStore.has_challenge(dicChallenge["challenge"]):
+                    raise Exception("Challenge %s already exists in %s. Aborting." % (
+                        dicChallenge["challenge"], sTargetDBPath))
+                oTargetStore.add_challenge(dicChallenge)
+                lMigrated += 1
+            aTests = oSourceDB.get(DB_TESTS_KEY, [])
+            aFingerprints = [None] * len(aTests)
+            for sKey in oSourceDB.keys():
+                if sKey.startswith(DB_FINGERPRINT_KEY_PREFIX):
+                    for lPosition in oSourceDB[sKey]:
+                        aFingerprints[lPosition] = sKey[len(DB_FINGERPRINT_KEY_PREFIX):]
+            oTargetTestStore.save_tests(aTests, aFingerprints)
+            oTargetTestStore.save_pair_data_items(
+                SqliteDictTestStore(oSourceDB).get_pair_data_items())
+        return lMigrated
+    finally:
+        if oTargetStore is not None:
+            oTargetStore.close()
+        oSourceDB.close()
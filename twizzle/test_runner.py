@@ -1,53 +1,623 @@
 from twizzle import Twizzle
+from twizzle.storage import STORAGE_SQLITEDICT
 from multiprocessing.pool import ThreadPool
-from threading import Lock
+from threading import Condition, Event, Lock, Thread
+from queue import Queue, Empty
+from collections import deque
+import functools
+import multiprocessing
+import traceback
+import numpy as np
+import pickle
+import time
+
+BACKEND_THREAD = "thread"
+BACKEND_PROCESS = "process"
+
+# Twizzle instance of a worker process of the process backend
+_oProcessTwizzle = None
+
+
+def _init_process_worker(sDBPath, sStorage, sSnapshotDir=None):
+    """initializer of the worker processes: opens the database once per process"""
+    global _oProcessTwizzle
+    _oProcessTwizzle = Twizzle(sDBPath, sStorage, sSnapshotDir)
+
+
+def _run_test_in_process(sChallengeName, fnCallback, dicCallbackParameters, bStorePairData=False):
+    """runs a whole test inside a worker process"""
+    return _oProcessTwizzle.run_test(sChallengeName, fnCallback, dicCallbackParameters,
+                                     bStorePairData=bStorePairData)
+
+
+def _run_threshold_sweep_in_process(sChallengeName, fnCallback, aThresholds, dicCallbackParameters,
+                                    bStorePairData=False):
+    """runs a whole threshold sweep inside a worker process"""
+    return _oProcessTwizzle.run_threshold_sweep(sChallengeName, fnCallback, aThresholds, dicCallbackParameters,
+                                                bStorePairData=bStorePairData)
+
+
+def _run_shard(fnCallback, aOriginalObjects, aComparativeObjects, dicCallbackParameters):
+    """runs the callback on one shard of a challenge"""
+    return fnCallback(aOriginalObjects, aComparativeObjects, **dicCallbackParameters)
+
+
+def _call_in_process(fnTask, *args):
+    """runs a task inside a worker process and hands the result back to the parent
+
+    Exceptions that can not be pickled are replaced by an Exception carrying
+    their type, message and traceback, so they always reach the parent.
+    """
+    try:
+        return fnTask(*args)
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise Exception("%s: %s\n%s" % (
+                type(e).__name__, e, traceback.format_exc())) from None
+        raise
+
+
+def _merge_additional_information(aAdditionalInformation):
+    """merges the additional information returned by the shards of a test
+
+    Values all shards agree on are kept as they are, values that differ
+    between shards are collected in a list in shard order.
+    """
+    def is_equal(a, b):
+        try:
+            return bool(a == b)
+        except ValueError:
+            return np.array_equal(a, b)
+
+    dicMerged = {}
+    for sKey in dict.fromkeys(k for dic in aAdditionalInformation for k in dic):
+        aValues = [dic.get(sKey) for dic in aAdditionalInformation]
+        if all(is_equal(aValues[0], v) for v in aValues[1:]):
+            dicMerged[sKey] = aValues[0]
+        else:
+            dicMerged[sKey] = aValues
+    return dicMerged
+
+
+class _ShardedTest(object):
+    """ collects the shards of a test whose challenge was split into shards running in parallel """
+
+    def __init__(self, tw, dicChallenge, lNrOfShards, fnFinished, fnFailed, aThresholds=None,
+                 bStorePairData=False):
+        """Constructor of the _ShardedTest class
+
+        Args:
+            tw (:obj:`Twizzle`): Twizzle instance used to evaluate the merged decisions
+            dicChallenge (:obj:): challenge object the shards were cut from
+            lNrOfShards (int): number of shards submitted
+            fnFinished (function): called with the test once all shards are done
+            fnFailed (function): called with the first exception raised by a shard
+            aThresholds (:obj:`list` of :obj:`float`): thresholds if the test is a threshold sweep
+            bStorePairData (bool): attach the merged decisions or scores to the test
+        """
+        self.tw = tw
+        self.dicChallenge = dicChallenge
+        self.aResults = [None] * lNrOfShards
+        self.lPending = lNrOfShards
+        self.fnFinished = fnFinished
+        self.fnFailed = fnFailed
+        self.aThresholds = aThresholds
+        self.bStorePairData = bStorePairData
+        self.bFailed = False
+        self.lock = Lock()
+
+    def shard_finished(self, lShard, tpResult):
+        """stores the result of a shard and evaluates the test after the last one"""
+        with self.lock:
+            if self.bFailed:
+                return
+            self.aResults[lShard] = tpResult
+            self.lPending -= 1
+            if self.lPending > 0:
+                return
+        try:
+            oResult = self.__evaluate()
+        except Exception as e:
+            self.shard_failed(e)
+            return
+        self.fnFinished(oResult)
+
+    def shard_failed(self, oError):
+        """reports the first failing shard, the results of the other shards are dropped"""
+        with self.lock:
+            if self.bFailed:
+                return
+            self.bFailed = True
+            self.aResults = None
+        self.fnFailed(oError)
+
+    def __evaluate(self):
+        """evaluates the merged decisions like `Twizzle.run_test`
+
+        If the test is a threshold sweep, the shards return scores that are
+        evaluated like `Twizzle.run_threshold_sweep`.
+        """
+        aShardDecisions = [tpResult[0] for tpResult in self.aResults]
+        aAdditionalInformation = [tpResult[1] for tpResult in self.aResults]
+        self.aResults = None
+
+        if all(isinstance(aDecisions, list) for aDecisions in aShardDecisions):
+            aDecisions = [bDecision for aDecisions in aShardDecisions
+                          for bDecision in aDecisions]
+        else:
+            aDecisions = np.concatenate(
+                [np.asarray(aDecisions) for aDecisions in aShardDecisions])
+        dicAdditionalInformation = _merge_additional_information(
+            aAdditionalInformation)
+        if self.aThresholds is not None:
+            aTests = self.tw.evaluate_scores(self.dicChallenge, aDecisions, self.aThresholds,
+                                             dicAdditionalInformation)
+            if self.bStorePairData:
+                self.tw.attach_pair_data(aTests, aScores=aDecisions)
+            return aTests
+        dicTest = self.tw.evaluate_decisions(
+            self.dicChallenge, aDecisions, dicAdditionalInformation)
+        if self.bStorePairData:
+            self.tw.attach_pair_data([dicTest], aDecisions=aDecisions)
+        return dicTest
 
 
 class TestRunner(object):
-    """ TestRunner - creates a multi threaded environment for running tests
+    """ TestRunner - creates a multi threaded or multi process environment for running tests
     """
 
-    def __init__(self, sDBPath, lNrOfThreads=2):
+    def __init__(self, sDBPath, lNrOfThreads=2, sStorage=STORAGE_SQLITEDICT, lCommitBatchSize=100,
+                 lCommitIntervalMs=1000, sBackend=BACKEND_THREAD, lShardSize=None, bStreamTests=False,
+                 lMaxTestsInFlight=None, bSkipExistingTests=False, bStorePairData=False, sSnapshotDir=None):
         """Constructor of a TestRunner class
 
         Note:
-            Please define the `DB_PATH` in the config.py or pass the path of the SQLite 
+            Please define the `DB_PATH` in the config.py or pass the path of the SQLite
             as parameter
+
+            Finished tests are handed to a background writer thread that saves them in
+            batches. A batch is committed as soon as it holds lCommitBatchSize tests or
+            its oldest test waited lCommitIntervalMs milliseconds.
+
+            The "process" backend runs the tests in freshly spawned worker processes,
+            so callbacks holding the GIL can use all cores. Callbacks and their
+            parameters have to be picklable then, i.e. be defined on module level of
+            a script guarded by `if __name__ == "__main__":`.
+
+            If lShardSize is set, challenges having more pairs are split into shards of
+            lShardSize pairs whose callbacks run in parallel. The decisions are merged in
+            order before the metrics are computed, so the test equals an unsharded run as
+            long as the additional information of the callback does not depend on the
+            shard. Values of the additional information that differ between shards are
+            stored as list in shard order. The sizes of the challenges and the last
+            challenge that was split are kept for the lifetime of the runner, so
+            challenges must not be replaced while it is running.
+
+            Tests are saved in the order they finish. No handle or result of a finished
+            test is kept, unless bStreamTests is set. Then finished tests are buffered
+            till they are consumed by `iter_finished_tests()`, which ends once
+            `finish_submitting()` was called and all tests are consumed.
+
+            If lMaxTestsInFlight is set, `run_test_async` and `run_threshold_sweep_async`
+            block while that many tests are submitted but not finished yet, so memory
+            stays flat regardless of the size of a sweep. With bStreamTests, finished
+            tests keep their slot till they are consumed, so the tests have to be
+            consumed by another thread than the one adding them.
+
+            Every test is saved with its fingerprint, see `Twizzle.get_test_fingerprint`.
+            If bSkipExistingTests is set, tests whose fingerprint was saved before are not
+            run again, so a crashed sweep can simply be restarted. With bStreamTests the
+            saved tests are yielded by `iter_finished_tests()` instead.
+
+            If bStorePairData is set, the decision (or for threshold sweeps the score) of
+            every pair is saved with the tests, see `Twizzle.attach_pair_data`.
+
+            If sSnapshotDir is set, every challenge is exported to a snapshot in this
+            directory when the runner submits its first test, see
+            `Twizzle.export_challenge_snapshot`. The workers memory-map the snapshot
+            instead of loading the challenge from the database, so worker processes
+            share one copy of it. The callbacks get PathSequences instead of lists then.
         Args:
             sDBPath (str): Path to the SQLite database.
             lNrOfThreads (int): number of threads to use for the tests
+            sStorage (str): challenge storage of the database, see `Twizzle`
+            lCommitBatchSize (int): maximal number of tests saved with one commit
+            lCommitIntervalMs (int): maximal time in milliseconds a finished test waits to be committed
+            sBackend (str): "thread" to run tests in a threadpool or "process" to run them in
+                            a pool of lNrOfThreads worker processes
+            lShardSize (int): maximal number of pairs passed to one callback call or None to
+                              run every test as one task
+            bStreamTests (bool): buffer finished tests for `iter_finished_tests()`
+            lMaxTestsInFlight (int): maximal number of submitted but unfinished tests or None
+                                     for no limit
+            bSkipExistingTests (bool): skip tests having the fingerprint of a saved test
+            bStorePairData (bool): save per-pair decisions and scores with the tests
+            sSnapshotDir (str): directory of challenge snapshots shared by the workers or None
         """
         if sDBPath is None:
             raise Exception("Path to SQL-Database has to be defined")
         if lNrOfThreads <= 0:
             raise Exception("lNrOfThreads has to be grater then 0")
-        self.tw = Twizzle(sDBPath)
-        self.oPool = ThreadPool(processes=lNrOfThreads)
-        self.aTaskPoolThreads = []
+        if lMaxTestsInFlight is not None and lMaxTestsInFlight <= 0:
+            raise Exception("lMaxTestsInFlight has to be grater then 0")
+        if lShardSize is not None and lShardSize <= 0:
+            raise Exception("lShardSize has to be grater then 0")
+        if lCommitBatchSize <= 0 or lCommitIntervalMs < 0:
+            raise Exception(
+                "lCommitBatchSize has to be grater then 0 and lCommitIntervalMs must not be negative")
+        self.tw = Twizzle(sDBPath, sStorage, sSnapshotDir)
+        self.sBackend = sBackend
+        self.lShardSize = lShardSize
+        if sBackend == BACKEND_THREAD:
+            self.oPool = ThreadPool(processes=lNrOfThreads)
+        elif sBackend == BACKEND_PROCESS:
+            self.oPool = multiprocessing.get_context("spawn").Pool(
+                processes=lNrOfThreads, initializer=_init_process_worker,
+                initargs=(sDBPath, sStorage, sSnapshotDir))
+        else:
+            raise Exception("Unknown backend %s. Use '%s' or '%s'." %
+                            (sBackend, BACKEND_THREAD, BACKEND_PROCESS))
         self.lock = Lock()
 
+        # bookkeeping of running tests
+        self.bStreamTests = bStreamTests
+        self.lMaxTestsInFlight = lMaxTestsInFlight
+        self.bSkipExistingTests = bSkipExistingTests
+        self.bStorePairData = bStorePairData
+        self.sSnapshotDir = sSnapshotDir
+        self.setSnapshots = set()
+        self.dicChallengeSizes = {}
+        self.tpShardedChallenge = None
+        self.oCondition = Condition()
+        self.lTestsInFlight = 0
+        self.aTestErrors = []
+        self.dqFinishedTests = deque()
+        self.bSubmissionFinished = False
+
+        # background writer
+        self.lCommitBatchSize = lCommitBatchSize
+        self.dCommitInterval = lCommitIntervalMs / 1000.0
+        self.oResultQueue = Queue()
+        self.aWriterErrors = []
+        self.oWriter = Thread(target=self.__write_results, daemon=True)
+        self.oWriter.start()
+
     def run_test_async(self, sChallengeName, fnCallback, dicCallbackParameters={}):
-        """add test run to threadpool
+        """add test run to the pool
+
+        Note:
+            Blocks while lMaxTestsInFlight tests are running or waiting to be consumed.
+
+        Args:
+            sChallengeName (str): name of the challenge that should be tested
+            fnCallback (function): test wrapper function that should be called
+            dicCallbackParameters (:obj:): Dictionary of parameters for  fnCallback
+
+        Returns:
+            None
+        """
+        if self.sBackend == BACKEND_PROCESS:
+            self.__submit_test(sChallengeName, fnCallback, dicCallbackParameters,
+                               _run_test_in_process,
+                               (sChallengeName, fnCallback, dicCallbackParameters, self.bStorePairData))
+        else:
+            self.__submit_test(sChallengeName, fnCallback, dicCallbackParameters,
+                               functools.partial(self.tw.run_test, bStorePairData=self.bStorePairData),
+                               (sChallengeName, fnCallback, dicCallbackParameters))
+
+    def run_threshold_sweep_async(self, sChallengeName, fnCallback, aThresholds, dicCallbackParameters={}):
+        """add a threshold sweep to the pool
+
+        Note:
+            The callback returns deviation scores instead of decisions and runs only
+            once. One test per threshold is saved, see `Twizzle.run_threshold_sweep`.
+            Blocks while lMaxTestsInFlight tests are running or waiting to be consumed.
 
         Args:
             sChallengeName (str): name of the challenge that should be tested
-            fnCallback (function): test wrapper function that should be called 
+            fnCallback (function): wrapper function returning deviation scores
+            aThresholds (:obj:`list` of :obj:`float`): thresholds that should be evaluated
             dicCallbackParameters (:obj:): Dictionary of parameters for  fnCallback
 
         Returns:
             None
         """
-        pThread = self.oPool.apply_async(
-            self.tw.run_test, (sChallengeName, fnCallback, dicCallbackParameters))
-        self.aTaskPoolThreads.append(pThread)
+        if self.sBackend == BACKEND_PROCESS:
+            self.__submit_test(sChallengeName, fnCallback, dicCallbackParameters,
+                               _run_threshold_sweep_in_process,
+                               (sChallengeName, fnCallback, aThresholds, dicCallbackParameters, self.bStorePairData),
+                               aThresholds)
+        else:
+            self.__submit_test(sChallengeName, fnCallback, dicCallbackParameters,
+                               functools.partial(self.tw.run_threshold_sweep,
+                                                 bStorePairData=self.bStorePairData),
+                               (sChallengeName, fnCallback, aThresholds, dicCallbackParameters), aThresholds)
+
+    def __submit_test(self, sChallengeName, fnCallback, dicCallbackParameters, fnTask, tpArgs, aThresholds=None):
+        """submits a test as one task or, if the challenge is large enough, as shards"""
+        if self.bSubmissionFinished:
+            raise Exception("No tests can be added after finish_submitting() or close()")
+        if self.sBackend == BACKEND_PROCESS:
+            try:
+                pickle.dumps((fnCallback, dicCallbackParameters))
+            except Exception as e:
+                raise Exception(
+                    "Callback and parameters have to be picklable for the process backend: %s" % e)
+
+        sFingerprint = self.tw.get_test_fingerprint(
+            sChallengeName, fnCallback, dicCallbackParameters, aThresholds, bRequired=self.bSkipExistingTests)
+        if self.bSkipExistingTests and self.tw.has_test(sFingerprint):
+            if self.bStreamTests:
+                aTests = self.tw.get_tests_by_fingerprint(sFingerprint)
+                with self.oCondition:
+                    self.__wait_for_slot()
+                    self.dqFinishedTests.append(aTests)
+                    self.oCondition.notify_all()
+            return
+
+        # challenges are exported once per runner, so snapshots are never outdated
+        if self.sSnapshotDir is not None and sChallengeName not in self.setSnapshots:
+            self.tw.export_challenge_snapshot(sChallengeName)
+            self.setSnapshots.add(sChallengeName)
+
+        with self.oCondition:
+            self.__wait_for_slot()
+            self.lTestsInFlight += 1
+
+        try:
+            self.__submit_test_tasks(sChallengeName, fnCallback, dicCallbackParameters, fnTask, tpArgs,
+                                     aThresholds, sFingerprint)
+        except Exception:
+            with self.oCondition:
+                self.lTestsInFlight -= 1
+                self.oCondition.notify_all()
+            raise
+
+    def __wait_for_slot(self):
+        """blocks while lMaxTestsInFlight tests are running or buffered, call with oCondition held
+
+        Tests finished but not consumed by `iter_finished_tests()` yet keep their slot.
+        """
+        while self.lMaxTestsInFlight is not None and \
+                self.lTestsInFlight + len(self.dqFinishedTests) >= self.lMaxTestsInFlight:
+            self.oCondition.wait()
+
+    def __submit_test_tasks(self, sChallengeName, fnCallback, dicCallbackParameters, fnTask, tpArgs, aThresholds,
+                            sFingerprint):
+        """submits the pool tasks of a test that already got a slot"""
+        fnFinished = functools.partial(self.__test_finished, sFingerprint)
+        dicChallenge = None
+        if self.lShardSize is not None:
+            dicChallenge = self.__get_challenge_to_shard(sChallengeName)
+
+        if dicChallenge is None:
+            self.__submit(fnTask, tpArgs, fnFinished, self.__test_failed)
+            return
+
+        lSize = len(dicChallenge["targetDecisions"])
+        aStarts = range(0, lSize, self.lShardSize)
+        oShardedTest = _ShardedTest(self.tw, dicChallenge, len(aStarts), fnFinished,
+                                    self.__test_failed, aThresholds, self.bStorePairData)
+        for lShard, i in enumerate(aStarts):
+            aOriginalObjects = dicChallenge["originalObjects"][i:i + self.lShardSize]
+            aComparativeObjects = dicChallenge["comparativeObjects"][i:i + self.lShardSize]
+            self.__submit(_run_shard, (fnCallback, aOriginalObjects, aComparativeObjects, dicCallbackParameters),
+                          functools.partial(oShardedTest.shard_finished, lShard), oShardedTest.shard_failed)
+
+    def __get_challenge_to_shard(self, sChallengeName):
+        """returns the challenge if it has more than lShardSize pairs, otherwise None
+
+        The size of every challenge and the last challenge that was split are kept
+        for the lifetime of the runner, so a sweep loads a challenge only once.
+        """
+        with self.lock:
+            if sChallengeName in self.dicChallengeSizes:
+                if self.dicChallengeSizes[sChallengeName] <= self.lShardSize:
+                    return None
+                if self.tpShardedChallenge is not None and self.tpShardedChallenge[0] == sChallengeName:
+                    return self.tpShardedChallenge[1]
+        dicChallenge = self.tw.get_challenge(sChallengeName)
+        lSize = len(dicChallenge["targetDecisions"])
+        with self.lock:
+            self.dicChallengeSizes[sChallengeName] = lSize
+            if lSize <= self.lShardSize:
+                return None
+            self.tpShardedChallenge = (sChallengeName, dicChallenge)
+        return dicChallenge
+
+    def __submit(self, fnTask, tpArgs, fnFinished, fnFailed):
+        """adds a task to the pool, tasks of the process backend report unpicklable exceptions"""
+        if self.sBackend == BACKEND_PROCESS:
+            self.oPool.apply_async(_call_in_process, (fnTask,) + tpArgs,
+                                   callback=fnFinished, error_callback=fnFailed)
+        else:
+            self.oPool.apply_async(
+                fnTask, tpArgs, callback=fnFinished, error_callback=fnFailed)
+
+    def __test_finished(self, sFingerprint, oResult):
+        """hands a finished test (or the tests of a threshold sweep) to the writer"""
+        # threshold sweeps return one test per threshold
+        aTests = oResult if isinstance(oResult, list) else [oResult]
+        for dicTest in aTests:
+            self.oResultQueue.put((dicTest, sFingerprint))
+        with self.oCondition:
+            if self.bStreamTests:
+                self.dqFinishedTests.append(aTests)
+            self.lTestsInFlight -= 1
+            self.oCondition.notify_all()
+
+    def __test_failed(self, oError):
+        """remembers the exception of a failed test
+
+        Streamed exceptions are also kept in aTestErrors till `iter_finished_tests()`
+        raised them, so callers not iterating still get them.
+        """
+        with self.oCondition:
+            if self.bStreamTests:
+                self.dqFinishedTests.append(oError)
+            self.aTestErrors.append(oError)
+            self.lTestsInFlight -= 1
+            self.oCondition.notify_all()
 
     def wait_till_tests_finished(self):
-        """block execution till all threads are done"""
-        # catch threads ready
-        for pThread in self.aTaskPoolThreads:
-            dicTest = pThread.get()
-            self.tw.save_test_threadsafe(dicTest, self.lock)
+        """block execution till all tests are done and saved
+
+        Note:
+            If tests raised an exception, all other tests are still saved before
+            the first exception is passed on.
+        """
+        try:
+            with self.oCondition:
+                while self.lTestsInFlight > 0:
+                    self.oCondition.wait()
+        finally:
+            self.flush()
+        with self.oCondition:
+            aErrors = self.aTestErrors
+            self.aTestErrors = []
+        if aErrors:
+            raise aErrors[0]
+
+    def finish_submitting(self):
+        """signal that no more tests are added, so `iter_finished_tests()` can end
+
+        Note:
+            Adding tests afterwards raises an exception. `close()` calls it as well.
+        """
+        with self.oCondition:
+            self.bSubmissionFinished = True
+            self.oCondition.notify_all()
+
+    def iter_finished_tests(self):
+        """yield tests in the order they finish till all submitted tests are consumed
+
+        Note:
+            Requires the TestRunner to be created with bStreamTests=True. The generator
+            ends once `finish_submitting()` was called and all tests are done and
+            consumed, so it can run while another thread is still adding tests. If a
+            test raised an exception, it is raised when it is reached. All yielded
+            tests are saved once the generator is exhausted.
+
+        Yields:
+            dicTest: dictionary of test results
+        """
+        if not self.bStreamTests:
+            raise Exception(
+                "TestRunner has to be created with bStreamTests=True to iterate finished tests")
+        while True:
+            with self.oCondition:
+                while not self.dqFinishedTests and (self.lTestsInFlight > 0 or not self.bSubmissionFinished):
+                    self.oCondition.wait()
+                if not self.dqFinishedTests:
+                    break
+                oItem = self.dqFinishedTests.popleft()
+                # the slot of the test is free once it is consumed
+                self.oCondition.notify_all()
+                if isinstance(oItem, BaseException) and oItem in self.aTestErrors:
+                    # raised to the consumer, so it is not raised again on close
+                    self.aTestErrors.remove(oItem)
+            if isinstance(oItem, BaseException):
+                raise oItem
+            for dicTest in oItem:
+                yield dicTest
+        self.flush()
+
+    def flush(self):
+        """block till the writer thread has committed all finished tests"""
+        if self.oWriter.is_alive():
+            oFlushed = Event()
+            self.oResultQueue.put(oFlushed)
+            oFlushed.wait()
+        if self.aWriterErrors:
+            oError = self.aWriterErrors[0]
+            self.aWriterErrors = []
+            raise oError
+
+    def close(self):
+        """wait for all tests, save them and shut down the pool and the writer thread
+
+        Note:
+            No tests can be added afterwards, see `finish_submitting()`.
+            Errors of tests that could not be saved during the shutdown are raised
+            after the pool and the writer thread stopped.
+        """
+        self.finish_submitting()
+        try:
+            self.wait_till_tests_finished()
+        finally:
+            self.oResultQueue.put(None)
+            self.oWriter.join()
+            self.oPool.close()
+            self.oPool.join()
+        if self.aWriterErrors:
+            oError = self.aWriterErrors[0]
+            self.aWriterErrors = []
+            raise oError
 
     def get_tests(self):
         """get all tests defined"""
         return self.tw.get_tests()
+
+    def __write_results(self):
+        """writer thread: collects finished tests from the queue and saves them in batches
+
+        Queue items are tuples of a test object and its fingerprint, an `Event`
+        requesting a flush or None requesting the thread to stop after a last commit.
+        """
+        aBatch = []
+        dDeadline = None
+        while True:
+            dTimeout = None if not aBatch else max(
+                0.0, dDeadline - time.monotonic())
+            try:
+                oItem = self.oResultQueue.get(timeout=dTimeout)
+            except Empty:
+                # oldest test waited long enough
+                aBatch = self.__commit(aBatch)
+                dDeadline = time.monotonic() + self.dCommitInterval
+                continue
+
+            if oItem is None:
+                self.__commit(aBatch)
+                return
+            if isinstance(oItem, Event):
+                aBatch = self.__commit(aBatch)
+                oItem.set()
+                continue
+
+            if not aBatch:
+                dDeadline = time.monotonic() + self.dCommitInterval
+            aBatch.append(oItem)
+            if len(aBatch) >= self.lCommitBatchSize:
+                aBatch = self.__commit(aBatch)
+                dDeadline = time.monotonic() + self.dCommitInterval
+
+    def __commit(self, aBatch):
+        """saves a batch of tests
+
+        Note:
+            If the batch can not be saved, its tests are saved one by one. Tests that
+            still fail (e.g. because they can not be pickled) are dropped and their
+            errors are raised by the next `flush`, so a single broken test does not
+            block saving all later tests.
+
+        Returns:
+            list: an empty batch
+        """
+        if not aBatch:
+            return []
+        try:
+            self.tw.save_tests([tpItem[0] for tpItem in aBatch],
+                               [tpItem[1] for tpItem in aBatch])
+        except Exception:
+            for dicTest, sFingerprint in aBatch:
+                try:
+                    self.tw.save_tests([dicTest], [sFingerprint])
+                except Exception as e:
+                    oError = Exception("Test of challenge %s could not be saved: %s: %s" % (
+                        dicTest.get("challenge"), type(e).__name__, e))
+                    oError.__cause__ = e
+                    self.aWriterErrors.append(oError)
+        return []
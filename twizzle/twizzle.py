@@ -2,16 +2,24 @@
 
 from sqlitedict import SqliteDict
 import numpy as np
+import hashlib
+import json
+import os
+import uuid
 
-DB_CHALLENGES_KEY = 'challenges'
-DB_TESTS_KEY = 'tests'
+from twizzle.storage import STORAGE_SQLITEDICT, TEST_PAIR_DATA_KEY, TEST_PAIR_DECISIONS_KEY, \
+    TEST_PAIR_SCORES_KEY, create_stores
+from twizzle.compact_challenge import CompactChallenge, get_snapshot_path, remove_snapshot, remove_snapshots
+from twizzle.metrics import compute_metrics, evaluate_decision_matrix, get_test_metrics
+from twizzle.score_analysis import analyze_scores
+from twizzle.utils import canonical_value
 
 
 class Twizzle(object):
     """Twizzle multi purpose benchmarking system -- base class
     """
 
-    def __init__(self, sDBPath):
+    def __init__(self, sDBPath, sStorage=STORAGE_SQLITEDICT, sSnapshotDir=None):
         """Constructor of the Twizzle class
 
         Note:
@@ -19,10 +27,21 @@ class Twizzle(object):
             as parameter
         Args:
             sDBPath (str): Path to the SQLite database.
+            sStorage (str): storage used for challenges and tests. "sqlitedict" keeps all
+                            challenges and all tests in one pickled list each, "sqlite" uses
+                            a challenges table, a separate pairs table and one row per test.
+                            Existing databases can be converted with
+                            `twizzle.storage.migrate_sqlitedict_to_sqlite`.
+            sSnapshotDir (str): directory of challenge snapshots written by `export_challenge_snapshot`.
+                                `get_challenge` memory-maps the snapshot of a challenge if there is one
+                                written from the challenge currently stored in the database.
         """
         if sDBPath is None:
             raise Exception("Path to SQL-Database has to be defined")
         self._db = SqliteDict(sDBPath)
+        self._challenges, self._tests = create_stores(
+            sStorage, sDBPath, self._db)
+        self.sSnapshotDir = sSnapshotDir
 
     def add_challenge(self, sName, aOriginalObjects, aComparativeObjects, aTargetDecisions, dicMetadata={}):
         """Adds a challenge under the given name to the database
@@ -64,13 +83,8 @@ class Twizzle(object):
         if (not all(isinstance(x, bool) for x in aTargetDecisions)) and not isinstance(aTargetDecisions, np.ndarray) and not (aTargetDecisions.dtype == np.dtype("bool")):
             raise Exception("The target decisions have to be boolean only.")
 
-        # get current challenges from database
-        aChallenges = self._db.get(DB_CHALLENGES_KEY, [])
-
         # test whether name was used before
-        aChallengesSameName = [
-            ch for ch in aChallenges if ch["challenge"] == sName]
-        if len(aChallengesSameName) != 0:
+        if self._challenges.has_challenge(sName):
             raise Exception(
                 "Challenge name %s is already in use. Define an other one. Aborting." % sName)
 
@@ -80,9 +94,49 @@ class Twizzle(object):
         # adding additional information if given
         if dicMetadata:
             dicChallenge = {**dicMetadata, **dicChallenge}
-        aChallenges.append(dicChallenge)
-        self._db[DB_CHALLENGES_KEY] = aChallenges
-        self._db.commit()
+        self._challenges.add_challenge(dicChallenge)
+        # a challenge deleted by another instance may have left its snapshot
+        self.__remove_snapshot(sName)
+
+    def add_identification_challenge(self, sName, aQueryObjects, aReferenceObjects, aTrueReferences, dicMetadata={}):
+        """Adds a 1:N identification challenge under the given name to the database
+
+        Note:
+            Every query object should be found among all reference objects. The challenge
+            is saved like a verification challenge: the queries are the original objects,
+            their true references the comparative objects ("" if a query has no match) and
+            the target decision tells whether a query has a match. The reference objects
+            are saved as metadata "referenceObjects", "challenge_type" is "identification".
+
+        Args:
+            sName (str): the name of the challenge.
+            aQueryObjects (:obj:`list` of :obj:`str`): List of paths of the objects that are searched for
+            aReferenceObjects (:obj:`list` of :obj:`str`): List of paths of the objects that are searched in
+            aTrueReferences (:obj:`list` of :obj:`str`): path of the reference object matching the query at
+                                                         the same position or None if there is no match
+            dicMetadata (:obj:): an object defining metadata for the challenge
+
+        Returns:
+            None
+        """
+        if (aQueryObjects is None) or (aReferenceObjects is None) or (aTrueReferences is None):
+            raise Exception("Parameters can not be None.")
+        if len(aQueryObjects) != len(aTrueReferences):
+            raise Exception(
+                "Queries and true references have to have the same amount of entries.")
+        if not all(isinstance(x, str) for x in aReferenceObjects):
+            raise Exception(
+                "All objects have to be defined as path given as string.")
+        setReferenceObjects = set(aReferenceObjects)
+        if any(x is not None and x not in setReferenceObjects for x in aTrueReferences):
+            raise Exception("True references have to be reference objects.")
+
+        aComparativeObjects = [x if x is not None else "" for x in aTrueReferences]
+        aTargetDecisions = [x is not None for x in aTrueReferences]
+        dicMetadata = {**dicMetadata, "challenge_type": "identification",
+                       "referenceObjects": list(aReferenceObjects)}
+        self.add_challenge(sName, aQueryObjects, aComparativeObjects,
+                           aTargetDecisions, dicMetadata)
 
     def del_challenge(self, sName):
         """ deletes an existing challenge by its name
@@ -94,18 +148,9 @@ class Twizzle(object):
             None
         """
 
-        # get current challenges from database
-        aChallenges = self._db.get(DB_CHALLENGES_KEY, [])
-        aMatches = [ch for ch in aChallenges if ch["challenge"] == sName]
-        if len(aMatches) == 0:
+        if not self._challenges.del_challenge(sName):
             raise Exception("No challenge named %s found." % sName)
-
-        # remove element
-        aChallenges.remove(aMatches[0])
-
-        # save new db
-        self._db[DB_CHALLENGES_KEY] = aChallenges
-        self._db.commit()
+        self.__remove_snapshot(sName)
 
     def get_challenges(self):
         """ getting a list of all defined challenges
@@ -113,7 +158,7 @@ class Twizzle(object):
         Returns:
             :obj:`list` of :obj:: `obj`:  List of all defined challenges
         """
-        return self._db.get(DB_CHALLENGES_KEY, [])
+        return self._challenges.get_challenges()
 
     def get_challenge(self, sChallengeName):
         """ getting a single challenge object
@@ -124,20 +169,97 @@ class Twizzle(object):
           Returns:
             :obj:: `obj`:  Object defining the challenge having the name sChallengeName
         """
-        aChallenges = self._db.get(DB_CHALLENGES_KEY, [])
-        aMatches = [ch for ch in aChallenges if ch["challenge"]
-                    == sChallengeName]
-        if len(aMatches) == 0:
+        if self.sSnapshotDir is not None:
+            sSnapshotPath = get_snapshot_path(
+                self.sSnapshotDir, sChallengeName)
+            try:
+                oCompactChallenge = CompactChallenge.load_snapshot(sSnapshotPath)
+            except FileNotFoundError:
+                # no snapshot or it was removed while loading
+                oCompactChallenge = None
+            # snapshots of deleted or replaced challenges are ignored
+            if oCompactChallenge is not None and oCompactChallenge.sVersion is not None and \
+                    oCompactChallenge.sVersion == self._challenges.get_challenge_version(sChallengeName):
+                return oCompactChallenge.to_challenge(bLazy=True)
+        dicChallenge = self._challenges.get_challenge(sChallengeName)
+        if dicChallenge is None:
             raise Exception("No challenge with name %s found." %
                             sChallengeName)
-        return aMatches[0]
+        return dicChallenge
 
-    def clear_challenges(self):
-        """ clears all challenge entries from the database """
-        self._db[DB_CHALLENGES_KEY] = []
-        self._db.commit()
+    def get_compact_challenge(self, sChallengeName):
+        """ getting a single challenge as CompactChallenge
+
+        Note:
+            The challenge is represented by a table of the distinct paths, int32 path
+            indices of the original and comparative objects and bit packed target
+            decisions, see `twizzle.compact_challenge.CompactChallenge`. With the
+            "sqlite" storage these arrays are loaded as they are stored.
+
+        Args:
+            sChallengeName (str): the name of the challenge to get
+
+        Returns:
+            :obj:`CompactChallenge`: the challenge having the name sChallengeName
+        """
+        oCompactChallenge = self._challenges.get_compact_challenge(
+            sChallengeName)
+        if oCompactChallenge is None:
+            raise Exception("No challenge with name %s found." %
+                            sChallengeName)
+        return oCompactChallenge
 
-    def run_test(self, sChallengeName, fnCallback, dicCallbackParameters={}, autosave_to_db=False):
+    def export_challenge_snapshot(self, sChallengeName, sSnapshotDir=None):
+        """ writes a challenge to a snapshot that can be memory-mapped read-only
+
+        Note:
+            A Twizzle instance created with sSnapshotDir returns the snapshot from
+            `get_challenge`: the objects are PathSequences decoding the paths from the
+            mapped path table on access and the target decisions a DecisionSequence
+            unpacking the mapped bits on access, so loading does not depend on the challenge size
+            and processes share the pages of the snapshot. The snapshot stores the version
+            of the challenge; `get_challenge` ignores it once the challenge was deleted or
+            replaced, export it again then. Deleting or replacing a challenge through an
+            instance having this snapshot directory removes the snapshot.
+
+        Args:
+            sChallengeName (str): the name of the challenge to export
+            sSnapshotDir (str): directory of the snapshots, by default the one of this instance
+
+        Returns:
+            str: directory of the snapshot of the challenge
+        """
+        if sSnapshotDir is None:
+            sSnapshotDir = self.sSnapshotDir
+        if sSnapshotDir is None:
+            raise Exception("Directory of the snapshots has to be defined")
+        # the version is read first, so a challenge replaced meanwhile is never taken for current
+        sVersion = self._challenges.get_challenge_version(sChallengeName)
+        oCompactChallenge = self._challenges.get_compact_challenge(
+            sChallengeName)
+        if oCompactChallenge is None:
+            raise Exception("No challenge with name %s found." %
+                            sChallengeName)
+        oCompactChallenge.sVersion = sVersion
+        os.makedirs(sSnapshotDir, exist_ok=True)
+        sSnapshotPath = get_snapshot_path(sSnapshotDir, sChallengeName)
+        oCompactChallenge.save_snapshot(sSnapshotPath)
+        return sSnapshotPath
+
+    def clear_challenges(self):
+        """ clears all challenge entries from the database and the snapshots of this instance """
+        self._challenges.clear_challenges()
+        if self.sSnapshotDir is not None:
+            remove_snapshots(self.sSnapshotDir)
+
+    def __remove_snapshot(self, sChallengeName):
+        """ removes the snapshot of a challenge from the snapshot directory of this instance """
+        if self.sSnapshotDir is not None:
+            remove_snapshot(get_snapshot_path(
+                self.sSnapshotDir, sChallengeName))
+
+    def run_test(self, sChallengeName, fnCallback, dicCallbackParameters={}, autosave_to_db=False,
+                 bSkipExisting=False, bStorePairData=False):
         """ run single challenge as test using given callback function and optional params
 
         Note:
@@ -162,6 +284,10 @@ class Twizzle(object):
             fnCallback (function): Pointer to wrapper-function that tests a challenge on a specific algorithm
                                     and makes decisions whether the objects are the same or not depending on its decision algorithm
             dicCallbackParameters (:obj:): Dictionary defining parameters for the function in fnCallback
+            autosave_to_db (bool): save the test together with its fingerprint
+            bSkipExisting (bool): return the saved test instead of running the callback if a test having
+                                  the same fingerprint was saved before, see `get_test_fingerprint`
+            bStorePairData (bool): save the decision of every pair with the test, see `attach_pair_data`
 
         Returns:
             dicTest: dictionary of test results that can be saved to db
@@ -169,72 +295,427 @@ class Twizzle(object):
         if not(sChallengeName) or not(fnCallback):
             raise Exception("Parameters are not allowed to be None.")
 
+        sFingerprint = self.get_test_fingerprint(
+            sChallengeName, fnCallback, dicCallbackParameters, bRequired=bSkipExisting)
+        if bSkipExisting:
+            aTests = self._tests.get_tests_by_fingerprint(sFingerprint)
+            if aTests:
+                return aTests[-1]
+
         dicChallenge = self.get_challenge(sChallengeName)
-        sChallengeName = dicChallenge["challenge"]
         aOriginalObjects = dicChallenge["originalObjects"]
         aComparativeObjects = dicChallenge["comparativeObjects"]
-        aTargetDecisions = dicChallenge["targetDecisions"]
 
         # run challenge
         aDecisions, dicAdditionalInformation = fnCallback(
             aOriginalObjects, aComparativeObjects, **dicCallbackParameters)
 
+        dicTest = self.evaluate_decisions(
+            dicChallenge, aDecisions, dicAdditionalInformation)
+        if bStorePairData:
+            self.attach_pair_data([dicTest], aDecisions=aDecisions)
+
+        # save test in db
+        if autosave_to_db:
+            self.__save_test(dicTest, sFingerprint)
+
+        return dicTest
+
+    def run_threshold_sweep(self, sChallengeName, fnCallback, aThresholds, dicCallbackParameters={},
+                            autosave_to_db=False, bSkipExisting=False, bStorePairData=False):
+        """ run single challenge once and evaluate the resulting scores for many thresholds
+
+        Note:
+            fnCallback has the same parameters like the callback of `run_test` but returns
+            deviation scores instead of decisions
+
+            Returns:
+            aScores, dicAdditionalInformation = fnCallback(...)
+            - aScores: list of deviation scores (e.g. normalized hamming distances) of the
+                       original object and the comparative object. A pair is decided to be
+                       the same (True) if its score is smaller or equal than the threshold.
+            - dicAdditionalInformation: additional information saved with every test
+
+        Args:
+            sChallengeName (str): the challenge that should be executed
+            fnCallback (function): Pointer to wrapper-function that calculates the deviation scores
+            aThresholds (:obj:`list` of :obj:`float`): thresholds that should be evaluated
+            dicCallbackParameters (:obj:): Dictionary defining parameters for the function in fnCallback
+            autosave_to_db (bool): save the tests together with the fingerprint of the sweep
+            bSkipExisting (bool): return the saved tests instead of running the callback if a sweep having
+                                  the same fingerprint was saved before, see `get_test_fingerprint`
+            bStorePairData (bool): save the score of every pair once for all tests of the sweep,
+                                   see `attach_pair_data`
+
+        Returns:
+            :obj:`list` of dicTest: one dictionary of test results per threshold
+        """
+        if not(sChallengeName) or not(fnCallback) or aThresholds is None:
+            raise Exception("Parameters are not allowed to be None.")
+
+        sFingerprint = self.get_test_fingerprint(
+            sChallengeName, fnCallback, dicCallbackParameters, aThresholds, bRequired=bSkipExisting)
+        if bSkipExisting:
+            aTests = self._tests.get_tests_by_fingerprint(sFingerprint)
+            if aTests:
+                return aTests
+
+        dicChallenge = self.get_challenge(sChallengeName)
+
+        # run challenge
+        aScores, dicAdditionalInformation = fnCallback(
+            dicChallenge["originalObjects"], dicChallenge["comparativeObjects"], **dicCallbackParameters)
+
+        aTests = self.evaluate_scores(
+            dicChallenge, aScores, aThresholds, dicAdditionalInformation)
+        if bStorePairData:
+            self.attach_pair_data(aTests, aScores=aScores)
+
+        # save tests in db
+        if autosave_to_db:
+            self.save_tests(aTests, [sFingerprint] * len(aTests))
+
+        return aTests
+
+    def run_identification_test(self, sChallengeName, fnCallback, dicCallbackParameters={}, autosave_to_db=False):
+        """ run an identification challenge as test using given callback function and optional params
+
+        Note:
+            fnCallback has to fullfill following specifications
+
+            Parameters:
+            fnCallback(aQueryObjects, aReferenceObjects, **dicCallbackParameters)
+            - aQueryObjects: list of strings describing paths to the objects searched for
+            - aReferenceObjects: list of strings describing paths to the objects searched in
+
+            Returns:
+            aResults, aLatencies, dicAdditionalInformation = fnCallback(...)
+            - aResults: for every query a list of the reference objects found, best match first
+                        (e.g. the ids returned by `HammingIndex.search_knn`)
+            - aLatencies: seconds every query took or None
+            - dicAdditionalInformation: additional information saved with the test
+
+        Args:
+            sChallengeName (str): the identification challenge that should be executed
+            fnCallback (function): Pointer to wrapper-function searching the queries
+            dicCallbackParameters (:obj:): Dictionary defining parameters for the function in fnCallback
+            autosave_to_db (bool): save the test together with its fingerprint
+
+        Returns:
+            dicTest: dictionary of test results that can be saved to db, see `evaluate_identification`
+        """
+        if not(sChallengeName) or not(fnCallback):
+            raise Exception("Parameters are not allowed to be None.")
+
+        dicChallenge = self.get_challenge(sChallengeName)
+        if dicChallenge.get("challenge_type") != "identification":
+            raise Exception(
+                "Challenge %s is no identification challenge." % sChallengeName)
+
+        # run challenge
+        aResults, aLatencies, dicAdditionalInformation = fnCallback(
+            dicChallenge["originalObjects"], dicChallenge["referenceObjects"], **dicCallbackParameters)
+
+        dicTest = self.evaluate_identification(
+            dicChallenge, aResults, aLatencies, dicAdditionalInformation)
+
+        # save test in db
+        if autosave_to_db:
+            self.__save_test(dicTest, self.get_test_fingerprint(
+                sChallengeName, fnCallback, dicCallbackParameters, bRequired=False))
+
+        return dicTest
+
+    def evaluate_identification(self, dicChallenge, aResults, aLatencies, dicAdditionalInformation):
+        """ compares the search results of a callback with the true references of an identification challenge
+
+        Note:
+            The rank of a query is the position of its true reference in its results
+            (1 for the best match). The test contains
+            - hit_rate: share of queries having a match whose match was found
+            - hit_rate_at_1: share of queries having a match whose match was found first
+            - mean_rank: mean rank of the matches found
+            - mean_reciprocal_rank: mean of 1 / rank, 0 for matches not found
+            - false_match_rate: share of queries without match getting any result
+            - latency_mean, latency_p50, latency_p90, latency_p99: query latencies in seconds
+
+        Args:
+            dicChallenge (:obj:): identification challenge as returned by `get_challenge`
+            aResults (:obj:`list` of :obj:`list`): reference objects found for every query, best first
+            aLatencies (:obj:`list` of :obj:`float`): seconds every query took or None
+            dicAdditionalInformation (:obj:): additional information returned by the callback
+
+        Returns:
+            dicTest: dictionary of test results that can be saved to db
+        """
+        aTargetDecisions = np.asarray(
+            dicChallenge["targetDecisions"], dtype=bool)
+        if len(aResults) != aTargetDecisions.size:
+            raise Exception(
+                "Array of Results is not the same size as given set of queries. Aborting.")
+
+        # rank of the true reference of every query having one, 0 if it was not found
+        aRanks = []
+        lFalseMatches = 0
+        for i, aFound in enumerate(aResults):
+            aFound = list(aFound)
+            if aTargetDecisions[i]:
+                sTrueReference = dicChallenge["comparativeObjects"][i]
+                aRanks.append(aFound.index(sTrueReference) + 1
+                              if sTrueReference in aFound else 0)
+            elif aFound:
+                lFalseMatches += 1
+        aRanks = np.array(aRanks, dtype=np.int64)
+        aHits = aRanks > 0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dicTest = dict(dicAdditionalInformation)
+            dicTest["challenge"] = dicChallenge["challenge"]
+            dicTest["hit_rate"] = np.mean(aHits) if aRanks.size else np.nan
+            dicTest["hit_rate_at_1"] = np.mean(aRanks == 1) if aRanks.size else np.nan
+            dicTest["mean_rank"] = np.mean(aRanks[aHits]) if aHits.any() else np.nan
+            dicTest["mean_reciprocal_rank"] = np.mean(
+                np.where(aHits, 1 / aRanks, 0)) if aRanks.size else np.nan
+            lNoMatches = aTargetDecisions.size - aRanks.size
+            dicTest["false_match_rate"] = lFalseMatches / lNoMatches if lNoMatches else np.nan
+
+        aLatencies = np.asarray(aLatencies if aLatencies is not None else [], dtype=np.float64)
+        if aLatencies.size:
+            dicTest["latency_mean"] = np.mean(aLatencies)
+            dicTest["latency_p50"], dicTest["latency_p90"], dicTest["latency_p99"] = np.percentile(
+                aLatencies, [50, 90, 99])
+        return dicTest
+
+    def evaluate_scores(self, dicChallenge, aScores, aThresholds, dicAdditionalInformation):
+        """ evaluates deviation scores for many thresholds in one vectorized pass
+
+        Note:
+            The scores of the positive and the negative pairs are sorted once. The
+            number of pairs decided to be the same for each threshold is then found
+            by a binary search, so no decision vector per threshold is built.
+
+        Args:
+            dicChallenge (:obj:): challenge object as returned by `get_challenge`
+            aScores (:obj:`list` of :obj:`float`): deviation scores returned by the callback
+            aThresholds (:obj:`list` of :obj:`float`): thresholds that should be evaluated
+            dicAdditionalInformation (:obj:): additional information returned by the callback
+
+        Returns:
+            :obj:`list` of dicTest: one dictionary of test results per threshold
+        """
+        aTargetDecisions = np.asarray(
+            dicChallenge["targetDecisions"], dtype=bool)
+        aScores = np.asarray(aScores, dtype=np.float64)
+        aThresholds = np.asarray(aThresholds, dtype=np.float64).ravel()
+
+        # check if site of scores is right
+        if aScores.shape != aTargetDecisions.shape:
+            raise Exception(
+                "Array of Scores is not the same size as given set of objects. Aborting.")
+
+        # NaN scores are sorted to the end and never decided to be the same
+        aPositiveScores = np.sort(aScores[aTargetDecisions])
+        aNegativeScores = np.sort(aScores[~aTargetDecisions])
+        aTP = np.searchsorted(aPositiveScores, aThresholds, side="right")
+        aFP = np.searchsorted(aNegativeScores, aThresholds, side="right")
+        aFN = aPositiveScores.size - aTP
+        aTN = aNegativeScores.size - aFP
+
+        dicMetrics = compute_metrics(aTP, aTN, aFP, aFN)
+
+        aTests = []
+        for i, dThreshold in enumerate(aThresholds):
+            # fill test object
+            dicTest = dict(dicAdditionalInformation)
+            dicTest["challenge"] = dicChallenge["challenge"]
+            dicTest["threshold"] = dThreshold
+            dicTest.update(get_test_metrics(dicMetrics, i))
+            aTests.append(dicTest)
+        return aTests
+
+    def evaluate_decisions(self, dicChallenge, aDecisions, dicAdditionalInformation):
+        """ compares the decisions of a callback with the target decisions of a challenge
+
+        Args:
+            dicChallenge (:obj:): challenge object as returned by `get_challenge`
+            aDecisions (:obj:`list` of :obj:`bool`): decisions returned by the callback
+            dicAdditionalInformation (:obj:): additional information returned by the callback
+
+        Returns:
+            dicTest: dictionary of test results that can be saved to db
+        """
+        sChallengeName = dicChallenge["challenge"]
+        aTargetDecisions = dicChallenge["targetDecisions"]
+
         # check if site of decisions is right
         if len(aDecisions) != len(aTargetDecisions):
             raise Exception(
                 "Array of Decisions is not the same size as given set of objects. Aborting.")
 
-        # calculate errorate
-        lTestsetSize = len(aTargetDecisions)
-        lErrors = np.count_nonzero(
-            np.array(aDecisions) != np.array(aTargetDecisions))
-        dErrorRate = lErrors / lTestsetSize
-
-        lTP = np.sum(np.logical_and(
-            aDecisions == True, aTargetDecisions == True))
-        lTN = np.sum(np.logical_and(
-            aDecisions == False, aTargetDecisions == False))
-        lFP = np.sum(np.logical_and(
-            aDecisions == True, aTargetDecisions == False))
-        lFN = np.sum(np.logical_and(
-            aDecisions == False, aTargetDecisions == True))
-        dAccuracy = (lTP+lTN)/(lTP+lTN+lFP+lFN)
-        dPrecision = lTP/(lTP+lFP)
-        dRecall = lTP/(lTP+lFN)
-        dF1score = 2*((dPrecision*dRecall)/(dPrecision+dRecall))
-        dFAR = lFP/(lFP + lTN)
-        dFRR = lFP/(lFP + lTN)
+        dicMetrics = evaluate_decision_matrix(aDecisions, aTargetDecisions)
 
         # fill test object
         dicTest = dicAdditionalInformation
         dicTest["challenge"] = sChallengeName
-        dicTest["errorrate"] = dErrorRate
-        dicTest["TP"] = lTP
-        dicTest["TN"] = lTN
-        dicTest["FP"] = lFP
-        dicTest["FN"] = lFN
-        dicTest["accuracy"] = dAccuracy
-        dicTest["recall"] = dRecall
-        dicTest["precision"] = dPrecision
-        dicTest["F1_score"] = dF1score
-        dicTest["FAR"] = dFAR
-        dicTest["FRR"] = dFRR
-
-        # save test in db
-        if autosave_to_db:
-            self.__save_test(dicTest)
+        dicTest.update(get_test_metrics(dicMetrics))
 
         return dicTest
 
-    def __save_test(self, dicTest):
+    def attach_pair_data(self, aTests, aScores=None, aDecisions=None):
+        """ attaches per-pair scores and decisions to tests, so they are saved with them
+
+        Note:
+            Scores are saved as float32 and decisions as uint8 array in a side table.
+            All given tests are linked to the same entry by the id stored under
+            "pair_data", e.g. the tests of a threshold sweep.
+
+        Args:
+            aTests (:obj:`list` of dicTest): tests the data belongs to
+            aScores (:obj:`list` of :obj:`float`): deviation score of every pair or None
+            aDecisions (:obj:`list` of :obj:`bool`): decision of every pair or None
+
+        Returns:
+            None
+        """
+        sPairDataId = uuid.uuid4().hex
+        for dicTest in aTests:
+            dicTest[TEST_PAIR_DATA_KEY] = sPairDataId
+            if aScores is not None:
+                dicTest[TEST_PAIR_SCORES_KEY] = np.asarray(
+                    aScores, dtype=np.float32)
+            if aDecisions is not None:
+                dicTest[TEST_PAIR_DECISIONS_KEY] = np.asarray(
+                    aDecisions, dtype=bool).astype(np.uint8)
+
+    def get_pair_data(self, dicTest):
+        """ getting the per-pair data saved with a test
+
+        Args:
+            dicTest (:obj:): test as returned by `get_tests`
+
+        Returns:
+            :obj:: dictionary holding the float32 array "scores" and the boolean array
+                   "decisions", each None if it was not saved
+        """
+        if TEST_PAIR_DATA_KEY not in dicTest:
+            raise Exception("Test has no per-pair data.")
+        dicPairData = self._tests.get_pair_data(dicTest[TEST_PAIR_DATA_KEY])
+        if dicPairData is None:
+            raise Exception("Per-pair data %s not found." %
+                            dicTest[TEST_PAIR_DATA_KEY])
+        aDecisions = dicPairData["decisions"]
+        return {"scores": dicPairData["scores"],
+                "decisions": None if aDecisions is None else aDecisions.astype(bool)}
+
+    def evaluate_stored_scores(self, dicTest, aThresholds):
+        """ evaluates the per-pair scores saved with a test for new thresholds without rerunning it
+
+        Note:
+            The scores are saved in float32 precision, scores lying exactly on a
+            threshold can be decided differently than in the original run.
+
+        Args:
+            dicTest (:obj:): test saved with per-pair scores, e.g. by `run_threshold_sweep`
+            aThresholds (:obj:`list` of :obj:`float`): thresholds that should be evaluated
+
+        Returns:
+            :obj:`list` of dicTest: one dictionary of test results per threshold, see `evaluate_scores`
+        """
+        aScores = self.get_pair_data(dicTest)["scores"]
+        if aScores is None:
+            raise Exception("Test has no per-pair scores.")
+        return self.evaluate_scores(self.get_challenge(dicTest["challenge"]), aScores, aThresholds, dicTest)
+
+    def analyze_stored_scores(self, dicTest, aFRRs=(0.001, 0.01, 0.1)):
+        """ computes ROC curve, AUC, EER and FAR at fixed FRR from the per-pair scores saved with a test
+
+        Args:
+            dicTest (:obj:): test saved with per-pair scores, e.g. by `run_threshold_sweep`
+            aFRRs (:obj:`list` of :obj:`float`): false rejection rates the false acceptance rate is reported for
+
+        Returns:
+            :obj:: analysis as returned by `score_analysis.analyze_scores`
+        """
+        aScores = self.get_pair_data(dicTest)["scores"]
+        if aScores is None:
+            raise Exception("Test has no per-pair scores.")
+        return analyze_scores(aScores, self.get_challenge(dicTest["challenge"])["targetDecisions"], aFRRs)
+
+    def get_test_fingerprint(self, sChallengeName, fnCallback, dicCallbackParameters={}, aThresholds=None,
+                             bRequired=True):
+        """ computes the fingerprint identifying a test
+
+        Note:
+            The fingerprint is a SHA256 over the challenge name, the module and qualified
+            name of the callback, the parameters of the callback (serialized with sorted keys,
+            see `utils.canonical_value`) and for threshold sweeps the thresholds. Parameters
+            like instances of classes can not be identified across runs, tests using them
+            have no fingerprint.
+
+        Args:
+            sChallengeName (str): the challenge of the test
+            fnCallback (function): the callback of the test
+            dicCallbackParameters (:obj:): Dictionary defining parameters for the function in fnCallback
+            aThresholds (:obj:`list` of :obj:`float`): thresholds of a threshold sweep or None
+            bRequired (bool): raise an exception if the test has no fingerprint, otherwise return None
+
+        Returns:
+            str: hex digest of the fingerprint
+        """
+        try:
+            aIdentity = [sChallengeName, canonical_value(fnCallback),
+                         canonical_value(dicCallbackParameters)]
+        except Exception as e:
+            if bRequired:
+                raise Exception("Test has no fingerprint: %s" % e)
+            return None
+        if aThresholds is not None:
+            aIdentity.append(canonical_value(
+                np.asarray(aThresholds, dtype=np.float64).ravel()))
+        sIdentity = json.dumps(aIdentity, sort_keys=True)
+        return hashlib.sha256(sIdentity.encode("utf-8")).hexdigest()
+
+    def has_test(self, sFingerprint):
+        """ returns True if a test having the given fingerprint was saved
+
+        Args:
+            sFingerprint (str): fingerprint as returned by `get_test_fingerprint`
+        """
+        return self._tests.has_fingerprint(sFingerprint)
+
+    def get_tests_by_fingerprint(self, sFingerprint):
+        """ getting the tests saved with a given fingerprint
+
+        Args:
+            sFingerprint (str): fingerprint as returned by `get_test_fingerprint`
+
+        Returns:
+            :obj:`list` of :obj:: `obj`:  List of the tests, empty if there is none
+        """
+        return self._tests.get_tests_by_fingerprint(sFingerprint)
+
+    def __save_test(self, dicTest, sFingerprint=None):
         """ saves a test object to the database"""
         if not dicTest:
             raise Exception("Test object must not be None.")
+        self._tests.save_tests([dicTest], [sFingerprint])
+
+    def save_tests(self, aTests, aFingerprints=None):
+        """ saves a batch of test objects to the database using a single commit
 
-        aTests = self._db.get(DB_TESTS_KEY, [])
-        aTests.append(dicTest)
-        self._db[DB_TESTS_KEY] = aTests
-        self._db.commit()
+        Args:
+            aTests (:obj:`list` of :obj:): test objects as returned by `run_test`
+            aFingerprints (:obj:`list` of :obj:`str`): fingerprints of the tests, see `get_test_fingerprint`
+
+        Returns:
+            None
+        """
+        if any(not dicTest for dicTest in aTests):
+            raise Exception("Test object must not be None.")
+        if aFingerprints is not None and len(aFingerprints) != len(aTests):
+            raise Exception(
+                "Tests and fingerprints have to have the same amount of entries.")
+        self._tests.save_tests(aTests, aFingerprints)
 
     def save_test_threadsafe(self, dicTest, lock):
         """ saves a test object to the database threadsafe"""
@@ -248,9 +729,14 @@ class Twizzle(object):
         Returns:
             :obj:`list` of :obj:: `obj`:  List of all tests executed
         """
-        return self._db.get(DB_TESTS_KEY, [])
+        return self._tests.get_tests()
 
     def clear_tests(self):
         """ delete all tests from the database """
-        self._db[DB_TESTS_KEY] = []
-        self._db.commit()
+        self._tests.clear_tests()
+
+    def close(self):
+        """ close the connections to the database, the instance can not be used afterwards """
+        self._challenges.close()
+        self._tests.close()
+        self._db.close()
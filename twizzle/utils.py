@@ -5,9 +5,66 @@
 """
 
 
-import cv2
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import functools
+import numpy as np
 import os
 import string
+import struct
+import sys
+
+# process wide cache of decoded images, disabled by default
+_oImageCache = None
+
+# reduction factors and names of OpenCV's reduced decoding modes, largest first
+_REDUCED_IMREAD_FLAGS = {
+    True: [(8, "IMREAD_REDUCED_GRAYSCALE_8"), (4, "IMREAD_REDUCED_GRAYSCALE_4"),
+           (2, "IMREAD_REDUCED_GRAYSCALE_2")],
+    False: [(8, "IMREAD_REDUCED_COLOR_8"), (4, "IMREAD_REDUCED_COLOR_4"),
+            (2, "IMREAD_REDUCED_COLOR_2")],
+}
+
+
+class _ImageCache(object):
+    """LRU cache of decoded images bounded by the total number of bytes of the cached images"""
+
+    def __init__(self, lMaxBytes):
+        self.lMaxBytes = lMaxBytes
+        self.lBytes = 0
+        self.lHits = 0
+        self.lMisses = 0
+        self._dicImages = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, tpKey):
+        with self._lock:
+            aImage = self._dicImages.get(tpKey)
+            if aImage is None:
+                self.lMisses += 1
+                return None
+            self._dicImages.move_to_end(tpKey)
+            self.lHits += 1
+            return aImage
+
+    def put(self, tpKey, aImage):
+        # images bigger than the whole cache are not cached
+        if aImage.nbytes > self.lMaxBytes:
+            return
+        with self._lock:
+            if tpKey in self._dicImages:
+                return
+            self._dicImages[tpKey] = aImage
+            self.lBytes += aImage.nbytes
+            while self.lBytes > self.lMaxBytes:
+                _, aEvicted = self._dicImages.popitem(last=False)
+                self.lBytes -= aEvicted.nbytes
+
+    def get_statistics(self):
+        with self._lock:
+            return {"hits": self.lHits, "misses": self.lMisses, "entries": len(self._dicImages),
+                    "bytes": self.lBytes, "max_bytes": self.lMaxBytes}
 
 
 def escape_home_in_path(sPath):
@@ -16,12 +73,195 @@ def escape_home_in_path(sPath):
 
 def save_image(aImage, sPathToImage):
     """saves a given image to the given location"""
+    import cv2
     cv2.imwrite(escape_home_in_path(sPathToImage), aImage)
 
 
 def load_image(sPathToImage):
-    """load an image from disk"""
-    return cv2.imread(escape_home_in_path(sPathToImage))
+    """load an image from disk
+
+    Note:
+        If the image cache is enabled (see `enable_image_cache`), decoded images are
+        shared between all callers and returned read-only. Copy an image before
+        modifying it in place.
+    """
+    import cv2
+    return __imread(escape_home_in_path(sPathToImage), cv2.IMREAD_COLOR)
+
+
+def load_image_reduced(sPathToImage, lMinWidth, lMinHeight, bGrayscale=True, lMinScale=4):
+    """load an image from disk decoding it at a reduced resolution still covering a given size
+
+    Note:
+        Uses the reduced decoding modes of OpenCV (1/2, 1/4 or 1/8 of the size), which
+        skip most of the work of decoding a JPEG image. The largest reduction is chosen
+        whose result is at least lMinScale times lMinWidth x lMinHeight pixels large in
+        both orientations, so downscaling it further yields nearly the same pixels as
+        downscaling the fully decoded image. The size is read from the JPEG header;
+        other formats gain nothing from a reduced decode and are decoded at full
+        resolution.
+
+    Args:
+        sPathToImage (str): path to the image
+        lMinWidth (int): minimal width of the decoded image
+        lMinHeight (int): minimal height of the decoded image
+        bGrayscale (bool): decode to a single grayscale channel
+        lMinScale (int): factor by which the decoded image has to be at least larger than the given size
+
+    Returns:
+        the decoded image or None if it could not be read
+    """
+    import cv2
+    sPath = escape_home_in_path(sPathToImage)
+    lFullFlag = cv2.IMREAD_GRAYSCALE if bGrayscale else cv2.IMREAD_COLOR
+    tpSize = __read_jpeg_size(sPath)
+    if tpSize is None:
+        return __imread(sPath, lFullFlag)
+
+    # the image may be rotated according to its EXIF orientation
+    lShortSide = min(tpSize)
+    lRequired = max(lMinWidth, lMinHeight) * lMinScale
+    for lFactor, sFlag in _REDUCED_IMREAD_FLAGS[bGrayscale]:
+        if -(-lShortSide // lFactor) >= lRequired:
+            aImage = __imread(sPath, getattr(cv2, sFlag))
+            if aImage is not None and min(aImage.shape[:2]) >= lRequired:
+                return aImage
+            break
+    return __imread(sPath, lFullFlag)
+
+
+def __imread(sPath, lFlag):
+    """decodes an image using the image cache if it is enabled"""
+    import cv2
+    oCache = _oImageCache
+    if oCache is None:
+        return cv2.imread(sPath, lFlag)
+
+    try:
+        oStat = os.stat(sPath)
+    except OSError:
+        return cv2.imread(sPath, lFlag)
+    tpKey = (sPath, oStat.st_mtime_ns, oStat.st_size, lFlag)
+    aImage = oCache.get(tpKey)
+    if aImage is None:
+        aImage = cv2.imread(sPath, lFlag)
+        if aImage is not None:
+            aImage.flags.writeable = False
+            oCache.put(tpKey, aImage)
+    return aImage
+
+
+def __read_jpeg_size(sPath):
+    """reads (width, height) from the header of a JPEG file, None for other files"""
+    try:
+        with open(sPath, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            # walk the markers till the start of frame
+            while True:
+                bMarker = f.read(2)
+                if len(bMarker) < 2 or bMarker[0] != 0xFF:
+                    return None
+                lMarker = bMarker[1]
+                if lMarker == 0xFF:
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                if lMarker == 0xD8 or 0xD0 <= lMarker <= 0xD7 or lMarker == 0x01:
+                    continue
+                bLength = f.read(2)
+                if len(bLength) < 2:
+                    return None
+                lLength = struct.unpack(">H", bLength)[0]
+                if 0xC0 <= lMarker <= 0xCF and lMarker not in (0xC4, 0xC8, 0xCC):
+                    bFrame = f.read(5)
+                    if len(bFrame) < 5:
+                        return None
+                    lHeight, lWidth = struct.unpack(">HH", bFrame[1:5])
+                    return lWidth, lHeight
+                f.seek(lLength - 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+
+def iterate_image_pairs(aOriginalObjects, aComparativeObjects, fnLoadImage=load_image, lNrOfWorkers=4,
+                        lBufferSize=32):
+    """yields the decoded (original, comparative) image pairs of a challenge, reading ahead in the background
+
+    Note:
+        Reading and decoding of the next pairs runs in a pool of lNrOfWorkers threads
+        while the caller processes the current pair. At most lBufferSize pairs are
+        decoded ahead. Pairs are yielded in the order of the lists.
+
+    Args:
+        aOriginalObjects (:obj:`list` of :obj:`str`): paths of the original images
+        aComparativeObjects (:obj:`list` of :obj:`str`): paths of the comparative images
+        fnLoadImage (function): function loading an image given its path
+        lNrOfWorkers (int): number of threads reading and decoding images
+        lBufferSize (int): maximal number of pairs decoded ahead
+
+    Yields:
+        tuple: original image and comparative image
+    """
+    if len(aOriginalObjects) != len(aComparativeObjects):
+        raise Exception(
+            "Image sets have to have the same amount of entries.")
+    if lNrOfWorkers <= 0 or lBufferSize <= 0:
+        raise Exception(
+            "lNrOfWorkers and lBufferSize have to be grater then 0")
+
+    def load_pair(sOriginal, sComparative):
+        return fnLoadImage(sOriginal), fnLoadImage(sComparative)
+
+    oExecutor = ThreadPoolExecutor(max_workers=lNrOfWorkers)
+    dqPending = deque()
+    itPairs = iter(zip(aOriginalObjects, aComparativeObjects))
+    try:
+        for tpPair in itPairs:
+            dqPending.append(oExecutor.submit(load_pair, *tpPair))
+            if len(dqPending) >= lBufferSize:
+                break
+        while dqPending:
+            tpImages = dqPending.popleft().result()
+            # refill the buffer before handing the pair to the caller
+            tpPair = next(itPairs, None)
+            if tpPair is not None:
+                dqPending.append(oExecutor.submit(load_pair, *tpPair))
+            yield tpImages
+    finally:
+        for oFuture in dqPending:
+            oFuture.cancel()
+        oExecutor.shutdown(wait=False)
+
+
+def enable_image_cache(lMaxBytes=512 * 1024 * 1024):
+    """enable a process wide LRU cache of images decoded by `load_image`
+
+    Note:
+        Images are identified by path, modification time and file size, so changed
+        files are decoded again. The least recently used images are evicted as soon
+        as the decoded images take more than lMaxBytes bytes.
+
+    Args:
+        lMaxBytes (int): maximal number of bytes of all cached images
+    """
+    global _oImageCache
+    if lMaxBytes <= 0:
+        raise Exception("lMaxBytes has to be grater then 0")
+    _oImageCache = _ImageCache(lMaxBytes)
+
+
+def disable_image_cache():
+    """disable the image cache of `load_image` and release all cached images"""
+    global _oImageCache
+    _oImageCache = None
+
+
+def get_image_cache_statistics():
+    """returns hits, misses, number of entries and bytes of the image cache or None if it is disabled"""
+    oCache = _oImageCache
+    if oCache is None:
+        return None
+    return oCache.get_statistics()
 
 
 def create_path(sPath):
@@ -60,6 +300,52 @@ def list_all_images_in_directory(sDirectoryPath):
             m for m in aFiles if m.lower().endswith((".png", ".bmp", ".jpg", ".jpeg", ".tiff"))]
 
 
+def __get_qualified_name(oValue):
+    """ returns "module.qualified_name" of a function or class that can be looked up by it, otherwise None """
+    sModule = getattr(oValue, "__module__", None)
+    sQualifiedName = getattr(oValue, "__qualname__", None)
+    if not isinstance(sModule, str) or not isinstance(sQualifiedName, str):
+        return None
+    oObject = sys.modules.get(sModule)
+    for sAttribute in sQualifiedName.split("."):
+        oObject = getattr(oObject, sAttribute, None)
+    if oObject is not oValue:
+        return None
+    return "%s.%s" % (sModule, sQualifiedName)
+
+
+def canonical_value(oValue):
+    """ converts a value to plain python values so equal parameters serialize equally
+
+    Note:
+        numpy scalars and arrays become python numbers and lists, functions, classes
+        and numpy ufuncs the string "module.qualified_name" and `functools.partial`
+        objects a dictionary of their function and arguments. Other values (e.g.
+        instances of classes, bound methods, lambdas and nested functions) can not be identified
+        across runs and raise an exception.
+    """
+    if isinstance(oValue, np.generic):
+        return oValue.item()
+    if oValue is None or isinstance(oValue, (str, int, float, bool)):
+        return oValue
+    if isinstance(oValue, np.ndarray):
+        return oValue.tolist()
+    if isinstance(oValue, (list, tuple)):
+        return [canonical_value(v) for v in oValue]
+    if isinstance(oValue, dict):
+        return {str(k): canonical_value(v) for k, v in oValue.items()}
+    if isinstance(oValue, np.ufunc):
+        return "numpy.%s" % oValue.__name__
+    if isinstance(oValue, functools.partial):
+        return {"partial": canonical_value(oValue.func), "args": canonical_value(oValue.args),
+                "keywords": canonical_value(oValue.keywords)}
+    sQualifiedName = __get_qualified_name(oValue)
+    if sQualifiedName is not None:
+        return sQualifiedName
+    raise Exception("Value %r of type %s can not be canonicalized." %
+                    (oValue, type(oValue).__name__))
+
+
 def format_filename(s):
     """
         Thanks to Sean Hammond (https://github.com/seanh)